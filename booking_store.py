@@ -0,0 +1,196 @@
+# booking_store.py
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 本地镜像配置：未设置 CAL_MIRROR_PATH 时不启用
+MIRROR_PATH = os.getenv("CAL_MIRROR_PATH")
+MAX_STALENESS = float(os.getenv("CAL_MIRROR_MAX_STALENESS", "60"))  # 读取镜像允许的最大数据延迟（秒）
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bookings (
+    id INTEGER PRIMARY KEY,
+    email TEXT NOT NULL,
+    start_epoch REAL,
+    end_epoch REAL,
+    status TEXT,
+    updated_at TEXT,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_bookings_email_start ON bookings(email, start_epoch);
+CREATE INDEX IF NOT EXISTS idx_bookings_start ON bookings(start_epoch);
+CREATE TABLE IF NOT EXISTS event_types (
+    id INTEGER PRIMARY KEY,
+    position INTEGER NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    scope TEXT PRIMARY KEY,
+    cursor TEXT,
+    synced_at REAL NOT NULL
+);
+"""
+
+
+class BookingStore:
+    """预约和事件类型的本地SQLite镜像"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+        logger.info(f"💾 Booking mirror opened at {path}")
+
+    @staticmethod
+    def _normalize(email):
+        return (email or "").strip().lower()
+
+    # ---- 预约 ----
+
+    def upsert_bookings(self, email, bookings):
+        """写入或更新预约；bookings 为 (booking, start_epoch, end_epoch) 序列"""
+        rows = [
+            (
+                booking["id"],
+                self._normalize(email),
+                start_epoch,
+                end_epoch,
+                (booking.get("status") or "").upper(),
+                booking.get("updatedAt"),
+                json.dumps(booking),
+            )
+            for booking, start_epoch, end_epoch in bookings
+            if booking.get("id") is not None
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO bookings "
+                "(id, email, start_epoch, end_epoch, status, updated_at, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def mark_cancelled(self, booking_id):
+        """把预约标记为已取消"""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT payload FROM bookings WHERE id = ?", (booking_id,)).fetchone()
+            if row is None:
+                return
+            payload = json.loads(row["payload"])
+            payload["status"] = "CANCELLED"
+            self._conn.execute(
+                "UPDATE bookings SET status = 'CANCELLED', payload = ? WHERE id = ?",
+                (json.dumps(payload), booking_id),
+            )
+
+    def bookings_for(self, email, start_epoch=None, end_epoch=None, statuses=None, limit=None):
+        """按邮箱、时间窗口和状态查询预约（未指定状态时排除已取消），按开始时间排序"""
+        sql = "SELECT payload FROM bookings WHERE email = ?"
+        args = [self._normalize(email)]
+        if start_epoch is not None:
+            sql += " AND start_epoch >= ?"
+            args.append(start_epoch)
+        if end_epoch is not None:
+            sql += " AND start_epoch < ?"
+            args.append(end_epoch)
+        if statuses:
+            sql += f" AND status IN ({','.join('?' * len(statuses))})"
+            args.extend(statuses)
+        else:
+            sql += " AND status != 'CANCELLED'"
+        sql += " ORDER BY start_epoch"
+        if limit:
+            sql += " LIMIT ?"
+            args.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [json.loads(row["payload"]) for row in rows]
+
+    def find_booking(self, email, start_epoch):
+        """按邮箱和UTC开始时间（精确到分钟）查找未取消的预约ID"""
+        minute = int(start_epoch // 60) * 60
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM bookings WHERE email = ? AND start_epoch >= ? AND start_epoch < ? "
+                "AND status != 'CANCELLED' LIMIT 1",
+                (self._normalize(email), minute, minute + 60),
+            ).fetchone()
+        return row["id"] if row else None
+
+    # ---- 事件类型 ----
+
+    def save_event_types(self, event_types):
+        """用最新列表整体替换事件类型"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM event_types")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO event_types (id, position, payload) VALUES (?, ?, ?)",
+                [(e["id"], i, json.dumps(e)) for i, e in enumerate(event_types) if "id" in e],
+            )
+        self.mark_synced("event_types")
+
+    def event_types(self):
+        """按原始顺序返回镜像中的事件类型"""
+        with self._lock:
+            rows = self._conn.execute("SELECT payload FROM event_types ORDER BY position").fetchall()
+        return [json.loads(row["payload"]) for row in rows]
+
+    # ---- 同步状态 ----
+
+    def sync_state(self, scope):
+        """返回 (cursor, synced_at)，从未同步时返回 (None, None)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT cursor, synced_at FROM sync_state WHERE scope = ?", (scope,)
+            ).fetchone()
+        return (row["cursor"], row["synced_at"]) if row else (None, None)
+
+    def mark_synced(self, scope, cursor=None):
+        """记录一次成功同步（cursor 为空时保留原游标）"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sync_state (scope, cursor, synced_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(scope) DO UPDATE SET "
+                "cursor = COALESCE(excluded.cursor, sync_state.cursor), synced_at = excluded.synced_at",
+                (scope, cursor, time.time()),
+            )
+
+    def staleness(self, scope):
+        """距上次同步的秒数，从未同步时返回无穷大"""
+        _, synced_at = self.sync_state(scope)
+        return float("inf") if synced_at is None else time.time() - synced_at
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """获取共享的镜像实例，未配置 CAL_MIRROR_PATH 时返回None"""
+    global _store
+    if not MIRROR_PATH:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = BookingStore(MIRROR_PATH)
+    return _store
+
+
+def bookings_scope(email):
+    """预约同步状态的作用域键"""
+    return f"bookings:{(email or '').strip().lower()}"
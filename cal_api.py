@@ -796,9 +796,18 @@ import requests
 import os
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import copy
 import json
 import logging
+from bisect import bisect_left
 import pytz
+import cal_transport
+import cal_cache
+import time_utils
+import booking_store
+from cal_flow import Request, Parallel, Spawn, Join, Blocking
+from slot_index import SlotIndex
 
 # 设置详细的日志记录
 logging.basicConfig(level=logging.INFO)
@@ -819,8 +828,84 @@ HEADERS = {
     "Content-Type": "application/json"
 }
 
-def make_request(method, endpoint, params=None, data=None):
-    """统一处理API请求"""
+# 熔断器打开时返回的错误
+CIRCUIT_OPEN_ERROR = {"error": "Cal.com is temporarily unavailable. Please try again shortly.", "circuit_open": True}
+
+# 预约列表分页大小
+BOOKINGS_PAGE_SIZE = int(os.getenv("CAL_BOOKINGS_PAGE_SIZE", "50"))
+# 批量预订时的最大并发提交数
+BULK_MAX_WORKERS = int(os.getenv("CAL_BULK_MAX_WORKERS", "4"))
+# 乐观预订：跳过预检查直接提交，由Cal.com拒绝冲突的预约
+OPTIMISTIC_BOOKING = os.getenv("CAL_OPTIMISTIC_BOOKING", "false").lower() in ("1", "true", "yes")
+# Cal.com 拒绝冲突预约时的响应特征
+CONFLICT_MARKERS = ("no_available_users_found", "already has booking", "not available", "conflict")
+# 预订预检查中推测性预取时隙使用的线程数
+PREFETCH_WORKERS = int(os.getenv("CAL_PREFETCH_WORKERS", "4"))
+prefetch_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="cal-prefetch")
+# 首次识别到用户邮箱时在后台预取其即将到来的预约和未来几天的可用时隙（默认关闭）
+PREFETCH_ON_EMAIL = os.getenv("CAL_PREFETCH_ON_EMAIL", "false").lower() in ("1", "true", "yes")
+PREFETCH_DAYS = int(os.getenv("CAL_PREFETCH_DAYS", "3"))
+# 用户预热使用单独的低优先级线程池，不占用预订路径的 prefetch_pool
+PREFETCH_USER_WORKERS = int(os.getenv("CAL_PREFETCH_USER_WORKERS", "1"))
+user_prefetch_pool = ThreadPoolExecutor(max_workers=PREFETCH_USER_WORKERS, thread_name_prefix="cal-warm")
+
+class CalAPIError(Exception):
+    """流式接口中遇到的API错误，error 为 make_request 返回的错误字典"""
+    def __init__(self, error):
+        super().__init__(error.get("error"))
+        self.error = error
+
+def run_flow(flow):
+    """同步驱动：执行编排流程（参见 cal_flow）产出的操作，直到流程返回
+    
+    Spawn 的子流程在预取线程池中执行，流程结束时未被 Join 的子流程会被取消。
+    """
+    spawned = []
+    value, error = None, None
+    try:
+        while True:
+            try:
+                effect = flow.throw(error) if error is not None else flow.send(value)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                value, error = perform(effect, spawned), None
+            except Exception as e:
+                value, error = None, e
+    finally:
+        flow.close()
+        for future in spawned:
+            future.cancel()
+
+def perform(effect, spawned):
+    """在当前线程中执行一个流程操作"""
+    if isinstance(effect, Request):
+        return make_request(effect.method, effect.endpoint, effect.params, effect.data)
+    if isinstance(effect, Parallel):
+        flows = list(effect.flows)
+        workers = min(effect.limit or len(flows), len(flows))
+        if workers <= 1:
+            return [run_flow(flow) for flow in flows]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(run_flow, flows))
+    if isinstance(effect, Spawn):
+        future = prefetch_pool.submit(run_flow, effect.flow)
+        spawned.append(future)
+        return future
+    if isinstance(effect, Join):
+        return effect.handle.result()
+    if isinstance(effect, Blocking):
+        return effect.fn(*effect.args)
+    raise TypeError(f"Unknown flow effect: {effect!r}")
+
+def mirror_call(fn, *args):
+    """在流程中执行会读写本地镜像的函数：启用镜像时作为阻塞操作交给驱动，否则直接调用"""
+    if booking_store.get_store() is None:
+        return fn(*args)
+    return (yield Blocking(fn, args))
+
+def prepare_request(method, endpoint, params=None, data=None):
+    """构建请求URL和查询参数（同步/异步客户端共用）"""
     # 在查询参数中添加API密钥
     params = params or {}
     if "apiKey" not in params:
@@ -831,30 +916,57 @@ def make_request(method, endpoint, params=None, data=None):
     logger.info(f"🔑 Parameters: {params}")
     if data:
         logger.info(f"📦 Payload: {json.dumps(data, indent=2)}")
+    return url, params
+
+def parse_response(response, url, params):
+    """把HTTP响应转换为结果字典（兼容requests和httpx的响应对象）"""
+    logger.info(f"🔧 Response status: {response.status_code}")
+    logger.info(f"📄 Response content: {response.text[:500]}")  # 只记录前500个字符
+    
+    # 处理响应
+    if response.status_code in [200, 201]:
+        return response.json()
+    else:
+        error_msg = {
+            "error": f"API request failed: {response.status_code}",
+            "status_code": response.status_code,
+            "url": url,
+            "params": params,
+            "response": response.text
+        }
+        logger.error(f"❌ Error: {json.dumps(error_msg, indent=2)}")
+        return error_msg
+
+def request_key(endpoint, params=None):
+    """GET请求的合并键：端点 + 排序后的查询参数"""
+    return endpoint, tuple(sorted((k, str(v)) for k, v in (params or {}).items()))
+
+def make_request(method, endpoint, params=None, data=None):
+    """统一处理API请求（并发的相同GET请求合并为一次）"""
+    if method != "GET":
+        return send_request(method, endpoint, params, data)
+    
+    result, shared = cal_transport.inflight.do(
+        request_key(endpoint, params),
+        lambda: send_request(method, endpoint, params, data),
+    )
+    if shared:
+        # 共享结果已由 SingleFlight 为每个调用方单独拷贝
+        logger.info(f"🤝 Coalesced GET {endpoint}")
+    return result
+
+def send_request(method, endpoint, params=None, data=None):
+    """发送单个API请求"""
+    url, params = prepare_request(method, endpoint, params, data)
     
     try:
-        if method == "GET":
-            response = requests.get(url, headers=HEADERS, params=params)
-        elif method == "POST":
-            response = requests.post(url, headers=HEADERS, json=data, params=params)
-        elif method == "DELETE":
-            response = requests.delete(url, headers=HEADERS, params=params)
-        
-        logger.info(f"🔧 Response status: {response.status_code}")
-        logger.info(f"📄 Response content: {response.text[:500]}")  # 只记录前500个字符
-        
-        # 处理响应
-        if response.status_code in [200, 201]:
-            return response.json()
-        else:
-            error_msg = {
-                "error": f"API request failed: {response.status_code}",
-                "url": url,
-                "params": params,
-                "response": response.text
-            }
-            logger.error(f"❌ Error: {json.dumps(error_msg, indent=2)}")
-            return error_msg
+        # 通过共享连接池发送请求（复用TCP/TLS连接，带超时）
+        response = cal_transport.send(method, url, headers=HEADERS, params=params, json=data)
+        return parse_response(response, url, params)
+    except cal_transport.CircuitOpenError as e:
+        # 后端不可用时快速失败，不占用工作线程
+        logger.warning(f"⛔ {str(e)}")
+        return CIRCUIT_OPEN_ERROR.copy()
     except Exception as e:
         error_msg = {"error": f"Request exception: {str(e)}"}
         logger.exception(f"❌ Exception during request")
@@ -865,15 +977,46 @@ def get_current_user():
     logger.info("🔍 Getting current user info...")
     return make_request("GET", "me")
 
-def get_event_types():
-    """获取用户的所有事件类型"""
+def get_event_types(force_refresh=False):
+    """获取用户的所有事件类型（优先使用进程内缓存）"""
+    return run_flow(event_types_flow(force_refresh))
+
+def event_types_flow(force_refresh=False):
+    if not force_refresh:
+        cached = cal_cache.event_types.get() or (yield from mirror_call(mirrored_event_types))
+        if cached is not None:
+            return cached
     logger.info("🔍 Getting event types...")
-    return make_request("GET", "event-types", {"username": CAL_USERNAME})
+    data = yield Request("GET", "event-types", {"username": CAL_USERNAME})
+    yield from mirror_call(store_event_types, data)
+    return data
+
+def mirrored_event_types():
+    """进程重启后从本地镜像恢复事件类型（在缓存TTL内有效）"""
+    store = booking_store.get_store()
+    if store is None or store.staleness("event_types") > cal_cache.event_types.ttl:
+        return None
+    data = {"event_types": store.event_types()}
+    cal_cache.event_types.set(data)
+    return data
+
+def store_event_types(data):
+    """写入内存缓存，并同步到本地镜像"""
+    cal_cache.event_types.set(data)
+    store = booking_store.get_store()
+    if store is not None and "error" not in data:
+        store.save_event_types(data.get("event_types", []))
 
 
 def get_first_event_type():
     """获取第一个事件类型及其时长"""
-    data = get_event_types()
+    return run_flow(first_event_type_flow())
+
+def first_event_type_flow():
+    return first_event_type((yield from event_types_flow()))
+
+def first_event_type(data):
+    """从事件类型响应中取第一个事件类型ID和时长"""
     if "error" in data:
         return None, None
     
@@ -885,7 +1028,7 @@ def get_first_event_type():
         event = event_types[0]
         return event["id"], event.get("length", 30)  # 默认30分钟
     
-#     return None, None
+    return None, None
 
 def get_most_suitable_event_type(duration=30):
     """根据时长选择最合适的事件类型"""
@@ -904,7 +1047,17 @@ def get_most_suitable_event_type(duration=30):
 
 def get_event_length(event_type_id):
     """获取事件类型的时长"""
-    event_types = get_event_types().get("event_types", [])
+    return run_flow(event_length_flow(event_type_id))
+
+def event_length_flow(event_type_id):
+    length = cal_cache.event_types.length_of(event_type_id)
+    if length is not None:
+        return length
+    return event_length_from((yield from event_types_flow()), event_type_id)
+
+def event_length_from(data, event_type_id):
+    """从事件类型响应中查找指定事件类型的时长"""
+    event_types = data.get("event_types", [])
     for event in event_types:
         if event["id"] == event_type_id:
             return event.get("length", 30)
@@ -912,6 +1065,9 @@ def get_event_length(event_type_id):
 
 def create_default_event_type():
     """创建默认事件类型"""
+    return run_flow(create_default_event_type_flow())
+
+def create_default_event_type_flow():
     logger.info("⚠️ No event types found, creating default...")
     payload = {
         "title": "30 Minute Meeting",
@@ -919,8 +1075,10 @@ def create_default_event_type():
         "length": 30,
         "hidden": False
     }
-    response = make_request("POST", "event-types", data=payload)
+    response = yield Request("POST", "event-types", data=payload)
     if "event_type" in response:
+        # 事件类型列表已变化，下次查询重新获取
+        cal_cache.event_types.invalidate()
         return response["event_type"]["id"]
     return None
 
@@ -1393,40 +1551,241 @@ def get_default_schedule():
 
 
 
-def list_events(email, timezone="UTC"):
-    """根据邮箱列出事件，并按指定时区转换时间，过滤已取消事件"""
+def list_events(email, timezone="UTC", start_date=None, end_date=None, status=None, limit=None,
+                max_staleness=None):
+    """根据邮箱列出事件，并按指定时区转换时间，过滤已取消事件
+
+    start_date/end_date（YYYY-MM-DD，用户时区）和 status 会作为服务器端过滤条件，
+    拿到 limit 条结果后不再请求后续页面。启用本地镜像时，在 max_staleness 秒
+    （默认 CAL_MIRROR_MAX_STALENESS）的数据延迟内直接从镜像读取。
+    """
+    return run_flow(list_events_flow(email, timezone, start_date, end_date, status, limit, max_staleness))
+
+def list_events_flow(email, timezone="UTC", start_date=None, end_date=None, status=None, limit=None,
+                     max_staleness=None):
     logger.info(f"📋 Listing events for {email}")
-    response = make_request("GET", "bookings", {"email": email})
-    
+    if not (status or limit):
+        prefetched = cal_cache.booking_lists.get(
+            (email, timezone, start_date, end_date), cal_cache.versions.stamp(email)
+        )
+        if prefetched is not None:
+            logger.info(f"⚡ Bookings for {email} served from prefetch")
+            return copy.deepcopy(prefetched)
+    if booking_store.get_store() is not None:
+        mirrored = yield Blocking(
+            mirror_list_events, (email, timezone, start_date, end_date, status, limit, max_staleness)
+        )
+        if mirrored is not None:
+            return mirrored
+    
+    user_tz = time_utils.get_timezone(timezone)
+    window = booking_window(start_date, end_date, timezone)
+    params = bookings_params(email, window, status)
+    bookings = []
+    seen = set()
+    page = 1
+    try:
+        while not (limit and len(bookings) >= limit):
+            page_bookings, last = yield from booking_page_flow(params, page, seen)
+            for booking in select_bookings(page_bookings, window, status):
+                bookings.append(localize_booking(booking, user_tz))
+                if limit and len(bookings) >= limit:
+                    break
+            if last:
+                break
+            page += 1
+    except CalAPIError as e:
+        return e.error
+    
+    result = {"bookings": bookings}  # 只返回有效事件
+    # 只有完整列表才能用来重建预约索引
+    if not (start_date or end_date or status or limit):
+        index_bookings(email, result)
+    return result
+
+def iter_events(email, timezone="UTC", start_date=None, end_date=None, status=None):
+    """逐页获取预约，惰性地产出已转换时区的结果（出错时抛出CalAPIError）"""
+    user_tz = time_utils.get_timezone(timezone)
+    window = booking_window(start_date, end_date, timezone)
+    for page_bookings in booking_pages(bookings_params(email, window, status)):
+        for booking in select_bookings(page_bookings, window, status):
+            yield localize_booking(booking, user_tz)
+
+def booking_pages(params):
+    """逐页获取原始预约列表，每页只产出之前未出现过的预约（出错时抛出CalAPIError）"""
+    seen = set()
+    page = 1
+    while True:
+        fresh, last = run_flow(booking_page_flow(params, page, seen))
+        yield fresh
+        if last:
+            return
+        page += 1
+
+def booking_page_flow(params, page, seen):
+    """获取一页预约，返回 (之前未出现过的预约, 是否为最后一页)，seen 记录已出现的预约ID"""
+    response = yield Request("GET", "bookings", page_params(params, page))
     if "error" in response:
-        return response
+        raise CalAPIError(response)
+    
+    page_bookings = response.get("bookings", [])
+    fresh = [b for b in page_bookings if b.get("id") not in seen]
+    seen.update(b.get("id") for b in fresh)
+    return fresh, is_last_page(page_bookings, len(fresh))
+
+def page_params(params, page):
+    """为查询参数添加分页参数"""
+    return {**params, "take": BOOKINGS_PAGE_SIZE, "page": page}
+
+def bookings_params(email, window=(None, None), status=None):
+    """构建预约列表查询参数（服务器端过滤，分页参数由 booking_pages 添加）
+
+    window 为 booking_window 返回的UTC区间（结束端不含），以Z后缀的UTC时间发送，dateTo 取结束前一秒。
+    """
+    params = {"email": email}
+    start, end = window
+    if start is not None:
+        params["dateFrom"] = time_utils.utc_iso(start)
+    if end is not None:
+        params["dateTo"] = time_utils.utc_iso(end - 1)
+    if status:
+        params["status"] = ",".join(normalize_statuses(status))
+    return params
+
+def normalize_statuses(status):
+    """把状态参数（字符串或列表）统一为排好序的大写列表"""
+    if isinstance(status, str):
+        status = status.split(",")
+    return sorted({s.strip().upper() for s in status if s and s.strip()})
+
+def booking_window(start_date=None, end_date=None, timezone="UTC"):
+    """把用户时区的日期范围转换为UTC epoch秒区间，未指定的一端为None"""
+    start = time_utils.local_epoch(start_date, "00:00", timezone) if start_date else None
+    end = time_utils.local_epoch(end_date, "00:00", timezone) + 86400 if end_date else None
+    return start, end
+
+def select_bookings(page_bookings, window, status):
+    """客户端兜底过滤：按状态和时间窗口筛选"""
+    statuses = set(normalize_statuses(status)) if status else None
+    start, end = window
+    selected = []
+    for booking in page_bookings:
+        booking_status = (booking.get("status") or "").upper()
+        if statuses is not None:
+            if booking_status not in statuses:
+                continue
+        elif booking_status == "CANCELLED":
+            # 过滤掉已取消的事件
+            continue
+        
+        if start is not None or end is not None:
+            booking_start = time_utils.parse_iso(booking.get("startTime"))
+            if booking_start is None:
+                continue
+            epoch = booking_start.timestamp()
+            if (start is not None and epoch < start) or (end is not None and epoch >= end):
+                continue
+        selected.append(booking)
+    return selected
 
-    # 过滤掉已取消的事件
-    active_bookings = [b for b in response.get("bookings", []) 
-                      if b.get("status") != "CANCELLED"]
+def is_last_page(page_bookings, new_count):
+    """返回数量不足一页，或没有新预约（服务器忽略了分页参数）时停止翻页"""
+    return len(page_bookings) < BOOKINGS_PAGE_SIZE or new_count == 0
 
-    # 转换时区
-    user_tz = pytz.timezone(timezone)
-    for booking in active_bookings:
-        if "startTime" in booking:
-            try:
-                # 解析UTC时间
-                start_utc = datetime.fromisoformat(booking["startTime"].replace("Z", "+00:00"))
-                end_utc = datetime.fromisoformat(booking["endTime"].replace("Z", "+00:00"))
-                
-                # 转换为用户时区
-                booking["local_start"] = start_utc.astimezone(user_tz).strftime("%Y-%m-%d %H:%M")
-                booking["local_end"] = end_utc.astimezone(user_tz).strftime("%H:%M")
-                
-                # 添加可读性更好的显示字段
-                booking["display_time"] = f"{booking['local_start']} - {booking['local_end']}"
-            except Exception as e:
-                logger.error(f"❌ Error converting time: {str(e)}")
-                booking["local_start"] = booking["startTime"]
-                booking["local_end"] = booking["endTime"]
-                booking["display_time"] = f"{booking['startTime']} - {booking['endTime']}"
+def sync_bookings(email):
+    """增量同步该邮箱的预约到本地镜像，只拉取上次游标之后变化的记录
+
+    已取消的预约也会同步（标记状态），返回写入的记录数；未启用镜像或请求失败时返回None。
+    """
+    store = booking_store.get_store()
+    if store is None:
+        return None
+    scope = booking_store.bookings_scope(email)
+    cursor, _ = store.sync_state(scope)
+    params = {"email": email}
+    if cursor:
+        params["updatedAfter"] = cursor  # 服务器端增量过滤，不支持时由客户端按 updatedAt 兜底
+    
+    written = 0
+    latest = cursor
+    try:
+        for page_bookings in booking_pages(params):
+            rows = []
+            for booking in page_bookings:
+                updated_at = booking.get("updatedAt")
+                if cursor and updated_at and updated_at <= cursor:
+                    continue
+                if updated_at and (latest is None or updated_at > latest):
+                    latest = updated_at
+                start = time_utils.parse_iso(booking.get("startTime"))
+                end = time_utils.parse_iso(booking.get("endTime"))
+                rows.append((booking, start.timestamp() if start else None, end.timestamp() if end else None))
+            written += store.upsert_bookings(email, rows)
+    except CalAPIError as e:
+        logger.warning(f"⚠️ Mirror sync failed for {email}: {e.error.get('error')}")
+        return None
     
-    return {"bookings": active_bookings}  # 只返回有效事件
+    store.mark_synced(scope, latest)
+    logger.info(f"💾 Synced {written} changed bookings for {email}")
+    return written
+
+def ensure_mirror_fresh(email, max_staleness=None):
+    """镜像数据超过允许延迟时先增量同步，返回镜像是否可用于读取"""
+    store = booking_store.get_store()
+    if store is None:
+        return False
+    bound = booking_store.MAX_STALENESS if max_staleness is None else max_staleness
+    if store.staleness(booking_store.bookings_scope(email)) <= bound:
+        return True
+    return sync_bookings(email) is not None
+
+def mirror_list_events(email, timezone="UTC", start_date=None, end_date=None, status=None, limit=None,
+                       max_staleness=None):
+    """从本地镜像读取预约列表，镜像不可用时返回None"""
+    if not ensure_mirror_fresh(email, max_staleness):
+        return None
+    start, end = booking_window(start_date, end_date, timezone)
+    statuses = normalize_statuses(status) if status else None
+    rows = booking_store.get_store().bookings_for(email, start, end, statuses, limit)
+    user_tz = time_utils.get_timezone(timezone)
+    logger.info(f"💾 Served {len(rows)} bookings for {email} from mirror")
+    return {"bookings": [localize_booking(booking, user_tz) for booking in rows]}
+
+def index_bookings(email, result):
+    """用完整的列表结果重建该邮箱的预约索引"""
+    if "error" in result:
+        return
+    entries = []
+    for booking in result.get("bookings", []):
+        start = time_utils.parse_iso(booking.get("startTime"))
+        if start is not None and "id" in booking:
+            entries.append((booking["id"], start.timestamp()))
+    cal_cache.bookings.load(email, entries)
+
+def localize_booking(booking, user_tz):
+    """为单个预约添加本地时间字段"""
+    if "startTime" in booking:
+        try:
+            # 解析UTC时间（相同字符串只解析一次）
+            start_utc = time_utils.parse_iso(booking["startTime"])
+            end_utc = time_utils.parse_iso(booking["endTime"])
+            
+            # 记录预约时间范围，取消时据此失效时隙缓存
+            if "id" in booking:
+                cal_cache.slots.note_booking(booking["id"], start_utc.timestamp(), end_utc.timestamp())
+            
+            # 转换为用户时区
+            booking["local_start"] = start_utc.astimezone(user_tz).strftime("%Y-%m-%d %H:%M")
+            booking["local_end"] = end_utc.astimezone(user_tz).strftime("%H:%M")
+            
+            # 添加可读性更好的显示字段
+            booking["display_time"] = f"{booking['local_start']} - {booking['local_end']}"
+        except Exception as e:
+            logger.error(f"❌ Error converting time: {str(e)}")
+            booking["local_start"] = booking["startTime"]
+            booking["local_end"] = booking["endTime"]
+            booking["display_time"] = f"{booking['startTime']} - {booking['endTime']}"
+    return booking
 
 
 
@@ -1434,17 +1793,166 @@ def list_events(email, timezone="UTC"):
 
 def cancel_event(booking_id):
     """取消事件"""
+    return run_flow(cancel_event_flow(booking_id))
+
+def cancel_event_flow(booking_id):
     logger.info(f"❌ Canceling booking {booking_id}")
-    return make_request("DELETE", f"bookings/{booking_id}")
+    result = yield Request("DELETE", f"bookings/{booking_id}")
+    if "error" not in result:
+        yield from mirror_call(record_cancellation, booking_id)
+    return result
+
+def cancel_events(email, start_date=None, end_date=None, status=None, timezone="UTC", max_workers=None):
+    """批量取消该邮箱在日期范围内（或指定状态）的预约
+    
+    一次列表遍历选出预约，再以有限并发发送DELETE。返回
+    {"cancelled": [预约ID], "failed": [{"id": 预约ID, "error": 错误}]}，列表失败时返回错误字典。
+    """
+    return run_flow(cancel_events_flow(email, start_date, end_date, status, timezone, max_workers))
+
+def cancel_events_flow(email, start_date=None, end_date=None, status=None, timezone="UTC", max_workers=None):
+    selected = yield from list_events_flow(email, timezone, start_date, end_date, status)
+    if "error" in selected:
+        return selected
+    
+    booking_ids = cancellable_ids(selected)
+    logger.info(f"❌ Bulk canceling {len(booking_ids)} bookings for {email}")
+    return (yield from cancel_bookings_flow(booking_ids, max_workers))
+
+def cancel_bookings(booking_ids, max_workers=None):
+    """以有限并发取消给定的预约（例如用户确认过的列表），返回格式同 cancel_events"""
+    return run_flow(cancel_bookings_flow(booking_ids, max_workers))
+
+def cancel_bookings_flow(booking_ids, max_workers=None):
+    results = yield Parallel(
+        [cancel_event_flow(booking_id) for booking_id in booking_ids], max_workers or BULK_MAX_WORKERS
+    )
+    return cancellation_summary(booking_ids, results)
+
+def cancellable_ids(result):
+    """列表结果中尚未取消的预约ID"""
+    return [
+        booking["id"] for booking in result.get("bookings", [])
+        if booking.get("id") is not None and (booking.get("status") or "").upper() != "CANCELLED"
+    ]
+
+def cancellation_summary(booking_ids, results):
+    """汇总批量取消的结果"""
+    summary = {"cancelled": [], "failed": []}
+    for booking_id, result in zip(booking_ids, results):
+        if "error" in result:
+            summary["failed"].append({"id": booking_id, "error": result["error"]})
+        else:
+            summary["cancelled"].append(booking_id)
+    return summary
+
+def record_cancellation(booking_id):
+    """取消成功后更新预约索引、本地镜像并失效重叠的时隙缓存"""
+    cal_cache.versions.bump(cal_cache.bookings.email_of(booking_id))
+    cal_cache.slots.invalidate_booking(booking_id)
+    cal_cache.bookings.remove(booking_id)
+    store = booking_store.get_store()
+    if store is not None:
+        store.mark_cancelled(booking_id)
 
 
 def get_available_slots(date, timezone="UTC", event_type_id=None):
-    """获取指定日期的可用时隙"""
-    logger.info(f"⏱️ Getting available slots for {date} in {timezone}")
-    
-    # 设置时间范围（当天00:00到23:59）
-    start_time = f"{date}T00:00:00"
-    end_time = f"{date}T23:59:59"
+    """获取指定日期的可用时隙（多日索引上的单日视图）"""
+    return slots_for_date(get_available_slots_range(date, date, timezone, event_type_id), date)
+
+def get_available_slots_range(start_date, end_date, timezone="UTC", event_type_id=None):
+    """一次请求获取日期范围内的可用时隙，返回按日期索引的结果（短TTL缓存）"""
+    return load_slots(start_date, end_date, timezone, event_type_id)[0]
+
+def get_slot_index(start_date, end_date, timezone="UTC", event_type_id=None):
+    """获取日期范围内预解析、已排序的时隙索引（与时隙缓存共用）"""
+    return load_slots(start_date, end_date, timezone, event_type_id)[1]
+
+def load_slots(start_date, end_date, timezone="UTC", event_type_id=None):
+    """获取时隙响应及其索引，优先使用缓存"""
+    return run_flow(load_slots_flow(start_date, end_date, timezone, event_type_id))
+
+def slot_index_flow(start_date, end_date, timezone="UTC", event_type_id=None):
+    return (yield from load_slots_flow(start_date, end_date, timezone, event_type_id))[1]
+
+def load_slots_flow(start_date, end_date, timezone="UTC", event_type_id=None):
+    if not event_type_id:
+        # 与预订路径使用同一事件类型，冲突建议可直接命中缓存
+        event_type_id, _ = yield from first_event_type_flow()
+    
+    cached = cal_cache.slots.find_covering(CAL_USERNAME, event_type_id, timezone, start_date, end_date)
+    if cached is not None:
+        logger.info(f"⚡ Slots for {start_date}..{end_date} in {timezone} served from cache")
+        return cached
+    
+    logger.info(f"⏱️ Getting available slots for {start_date}..{end_date} in {timezone}")
+    data = yield Request("GET", "slots", params=slots_params(start_date, end_date, timezone, event_type_id))
+    data = index_slots(data, start_date, end_date)
+    index = build_slot_index(data)
+    key = slot_cache_key(start_date, end_date, timezone, event_type_id)
+    cache_slots(key, data, index, start_date, end_date, timezone)
+    return data, index
+
+def index_slots(data, start_date, end_date):
+    """把时隙响应整理为按日期索引的结果，范围内没有时隙的日期对应空列表"""
+    if "error" in data:
+        return data
+    by_date = dict(data.get("slots") or {})
+    day = datetime.strptime(start_date, "%Y-%m-%d")
+    last = datetime.strptime(end_date, "%Y-%m-%d")
+    while day <= last:
+        by_date.setdefault(day.strftime("%Y-%m-%d"), [])
+        day += timedelta(days=1)
+    return {**data, "slots": by_date}
+
+def build_slot_index(data):
+    """把时隙响应解析为按日期排序的UTC时间索引（每个时隙只解析一次）"""
+    if "error" in data:
+        return SlotIndex()
+    return SlotIndex.from_response(data, parse_slot_utc)
+
+def slots_for_date(data, date):
+    """从按日期索引的结果中取出单日时隙"""
+    if "error" in data:
+        return data
+    return {"slots": {date: data["slots"].get(date, [])}}
+
+def slot_cache_key(start_date, end_date, timezone, event_type_id):
+    """时隙缓存键：(用户名, 事件类型ID, 日期范围, 时区)"""
+    return (CAL_USERNAME, event_type_id, start_date, end_date, timezone)
+
+def cache_slots(key, data, index, start_date, end_date, timezone):
+    """把时隙响应及索引写入缓存，并记录其覆盖的UTC范围"""
+    try:
+        user_tz = time_utils.get_timezone(timezone)
+        start = user_tz.localize(datetime.strptime(start_date, "%Y-%m-%d"))
+        end = user_tz.localize(datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1))
+    except Exception as e:
+        logger.warning(f"⚠️ Not caching slots: {str(e)}")
+        return
+    cal_cache.slots.set(key, data, index, start.timestamp(), end.timestamp())
+
+def record_booking(result, payload):
+    """预订成功后失效重叠的时隙缓存，并把新预约加入索引"""
+    start = time_utils.parse_iso(payload["start"]).timestamp()
+    end = time_utils.parse_iso(payload["end"]).timestamp()
+    cal_cache.slots.invalidate_range(start, end)
+    cal_cache.versions.bump(payload["responses"]["email"])
+    
+    booking = result.get("booking", result)
+    if isinstance(booking, dict) and booking.get("id") is not None:
+        email = payload["responses"]["email"]
+        cal_cache.slots.note_booking(booking["id"], start, end)
+        cal_cache.bookings.add(email, booking["id"], start)
+        store = booking_store.get_store()
+        if store is not None:
+            store.upsert_bookings(email, [(booking, start, end)])
+
+def slots_params(start_date, end_date, timezone="UTC", event_type_id=None):
+    """构建时隙查询参数"""
+    # 设置时间范围（开始日期00:00到结束日期23:59）
+    start_time = f"{start_date}T00:00:00"
+    end_time = f"{end_date}T23:59:59"
     
     params = {
         "username": CAL_USERNAME,
@@ -1457,124 +1965,190 @@ def get_available_slots(date, timezone="UTC", event_type_id=None):
     if event_type_id:
         params["eventTypeId"] = event_type_id
     
-    return make_request("GET", "slots", params=params)
+    return params
 
 def parse_slot_time(slot_time):
-    """解析时间槽字符串为datetime对象"""
-    try:
-        # 尝试解析ISO格式时间
-        return datetime.fromisoformat(slot_time)
-    except ValueError:
-        # 尝试解析其他常见格式
-        for fmt in ["%Y-%m-%dT%H:%M:%S%z", "%Y-%m-%dT%H:%M:%S.%f%z", "%Y-%m-%dT%H:%M%z"]:
-            try:
-                return datetime.strptime(slot_time, fmt)
-            except ValueError:
-                continue
-    return None
+    """解析时间槽字符串为datetime对象（带LRU缓存）"""
+    return time_utils.parse_iso(slot_time)
+
+def parse_slot_utc(slot_time):
+    """解析时间槽字符串，缺少时区信息时按UTC处理"""
+    slot_dt = parse_slot_time(slot_time)
+    if slot_dt is not None and slot_dt.tzinfo is None:
+        slot_dt = slot_dt.replace(tzinfo=pytz.utc)
+    return slot_dt
 
 def is_slot_available(date, time, duration, timezone="UTC", event_type_id=None):
     """检查特定时间段是否可用"""
-    slots = get_available_slots(date, timezone, event_type_id)
+    index = get_slot_index(date, date, timezone, event_type_id)
+    return slot_in_index(index, date, time, duration, timezone)
+
+def slot_in_index(index, date, time, duration, timezone="UTC", slot_length=None):
+    """在时隙索引中二分查找完整覆盖 [目标时间, 目标时间+duration分钟) 的时隙
     
-    # 检查是否有错误或没有时隙
-    if "error" in slots or "slots" not in slots or not slots["slots"].get(date):
+    slot_length 为索引所属事件类型的时长（分钟），默认与 duration 相同，此时只有
+    恰好从目标时间开始的时隙满足条件。
+    """
+    # 检查是否有时隙
+    if not index.starts(date):
         logger.warning(f"⚠️ No available slots found for {date}")
         return False
     
-    # 创建目标开始时间（本地时间）
-    target_start = datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M")
-    
-    # 创建目标结束时间
-    target_end = target_start + timedelta(minutes=duration)
-    
-    # 获取用户时区
-    user_tz = pytz.timezone(timezone)
-    
-    # 转换目标时间为用户时区
-    target_start_tz = user_tz.localize(target_start)
-    target_end_tz = user_tz.localize(target_end)
-    
-    logger.info(f"🔍 Checking availability for {target_start_tz} to {target_end_tz}")
-    
-    # 查找匹配的时隙
-    for slot in slots["slots"].get(date, []):
-        if "time" not in slot:
-            continue
-            
-        slot_time = slot["time"]
-        slot_dt = parse_slot_time(slot_time)
-        
-        if not slot_dt:
-            logger.warning(f"⚠️ Could not parse slot time: {slot_time}")
-            continue
-        
-        # 确保时间对象有时区信息
-        if slot_dt.tzinfo is None:
-            slot_dt = slot_dt.replace(tzinfo=pytz.utc)
-        
-        # 转换为用户时区
-        slot_dt_user = slot_dt.astimezone(user_tz)
-        
-        # 检查是否在目标时间范围内
-        if slot_dt_user == target_start_tz:
-            logger.info(f"✅ Found matching slot: {slot_dt_user}")
-            return True
+    target_start = time_utils.local_epoch(date, time, timezone)
+    logger.info(f"🔍 Checking availability for {date} {time} ({timezone}, {duration}min)")
     
+    if index.covers(date, target_start, duration * 60, (slot_length or duration) * 60):
+        logger.info(f"✅ Found matching slot: {date} {time}")
+        return True
     return False
 
-def book_event(email, date, time, reason, timezone="UTC"):
-    """预订新事件"""
+def nearest_slot_times(index, date, time, timezone="UTC", count=5):
+    """在时隙索引中查找离目标时间最近的若干时隙并格式化为本地HH:MM"""
+    try:
+        target = time_utils.local_epoch(date, time, timezone)
+    except ValueError:
+        target = time_utils.local_epoch(date, "00:00", timezone)
+    user_tz = time_utils.get_timezone(timezone)
+    return [
+        datetime.fromtimestamp(start, user_tz).strftime("%H:%M")
+        for start in index.nearest(date, target, count)
+    ]
+
+def resolve_event_type():
+    """获取预订使用的事件类型ID和时长，没有则创建默认事件类型"""
+    return run_flow(resolve_event_type_flow())
+
+def resolve_event_type_flow():
     # 尝试获取事件类型ID和时长
-    event_type_id, event_length = get_first_event_type()
+    event_type_id, event_length = yield from first_event_type_flow()
     
     # 如果没有事件类型，创建默认
     if not event_type_id:
-        event_type_id = create_default_event_type()
+        event_type_id = yield from create_default_event_type_flow()
         if not event_type_id:
-            return {"error": "Failed to create default event type"}
+            return None, None
         # 默认时长为30分钟
         event_length = 30
     
     # 如果没有获取到时长，使用默认30分钟
-    if not event_length:
-        event_length = 30
+    return event_type_id, event_length or 30
+
+def booking_payload(email, date, time, reason, timezone, event_type_id, event_length):
+    """构建预约请求体（本地时间转换为UTC）"""
+    # 创建带时区的时间对象
+    user_tz = time_utils.get_timezone(timezone)
+    naive_start = time_utils.parse_local(f"{date} {time}")
+    start_dt = user_tz.localize(naive_start)
+    
+    # 根据事件类型时长计算结束时间
+    end_dt = start_dt + timedelta(minutes=event_length)
+    
+    # 转换为UTC
+    utc_start = start_dt.astimezone(pytz.utc).isoformat()
+    utc_end = end_dt.astimezone(pytz.utc).isoformat()
+    
+    return {
+        "eventTypeId": event_type_id,
+        "start": utc_start,
+        "end": utc_end,
+        "responses": {
+            "name": email.split('@')[0],
+            "email": email,
+            "notes": reason
+        },
+        "timeZone": timezone,
+        "language": "en",
+        "metadata": {}
+    }
+
+def book_event(email, date, time, reason, timezone="UTC", optimistic=None, suggestions=0):
+    """预订新事件
     
-    # 检查时隙是否可用（使用事件类型ID）
-    if not is_slot_available(date, time, event_length, timezone, event_type_id):
-        return {"error": "Time slot not available"}
+    optimistic 为真时（默认取 CAL_OPTIMISTIC_BOOKING）跳过可用性预检查直接提交，
+    Cal.com 返回的冲突错误同样转换为 "Time slot not available"。
+    suggestions > 0 时，时隙不可用的结果附带离目标时间最近的若干可用时间（"suggestions"）。
+    预检查模式下当天时隙在解析事件类型的同时推测性预取；乐观模式下只在冲突之后才获取时隙。
+    """
+    return run_flow(book_event_flow(email, date, time, reason, timezone, optimistic, suggestions))
+
+def book_event_flow(email, date, time, reason, timezone="UTC", optimistic=None, suggestions=0):
+    if optimistic is None:
+        optimistic = OPTIMISTIC_BOOKING
+    # 预检查所需的当天时隙与事件类型解析并发获取（未用到时由驱动取消）
+    prefetch = None if optimistic else (yield Spawn(prefetch_day_slots_flow(date, timezone)))
     
+    event_type_id, event_length = yield from resolve_event_type_flow()
+    if not event_type_id:
+        return {"error": "Failed to create default event type"}
+    
+    # 检查时隙是否可用（使用事件类型ID）
+    if not optimistic:
+        index = yield from prefetched_index_flow(prefetch, date, timezone, event_type_id)
+        if not slot_in_index(index, date, time, event_length, timezone):
+            return unavailable_result(index, date, time, timezone, suggestions)
+    
+    result = yield from submit_booking_flow(email, date, time, reason, timezone, event_type_id, event_length)
+    if optimistic and is_booking_conflict(result):
+        record_conflict(date, time, timezone, event_length)
+        # 缓存已失效，备选时间按最新时隙计算
+        index = (yield from slot_index_flow(date, date, timezone, event_type_id)) if suggestions else None
+        return unavailable_result(index, date, time, timezone, suggestions)
+    return result
+
+def prefetch_day_slots_flow(date, timezone="UTC"):
+    """推测性获取当天时隙（按预订默认使用的事件类型），返回 (事件类型ID, 时隙索引)"""
+    event_type_id, _ = yield from first_event_type_flow()
+    if not event_type_id:
+        return None, None
+    return event_type_id, (yield from slot_index_flow(date, date, timezone, event_type_id))
+
+def prefetched_index_flow(prefetch, date, timezone, event_type_id):
+    """取出预取的时隙索引；预取失败或事件类型不一致（例如刚创建了默认类型）时重新获取"""
+    if prefetch is not None:
+        try:
+            prefetched_type, index = yield Join(prefetch)
+            if prefetched_type == event_type_id:
+                return index
+        except Exception as e:
+            logger.warning(f"⚠️ Slot prefetch failed: {str(e)}")
+    return (yield from slot_index_flow(date, date, timezone, event_type_id))
+
+def unavailable_result(index, date, time, timezone="UTC", suggestions=0):
+    """时隙不可用的结果，按需附带备选时间（不包含请求的时间本身）"""
+    result = {"error": "Time slot not available"}
+    if suggestions and index is not None:
+        options = [t for t in nearest_slot_times(index, date, time, timezone, suggestions + 1) if t != time]
+        result["suggestions"] = options[:suggestions]
+    return result
+
+def is_booking_conflict(result):
+    """预约请求是否因时间冲突被Cal.com拒绝"""
+    if "error" not in result or "status_code" not in result:
+        return False
+    if result["status_code"] == 409:
+        return True
+    text = str(result.get("response", "")).lower()
+    return result["status_code"] in (400, 422) and any(marker in text for marker in CONFLICT_MARKERS)
+
+def record_conflict(date, time, timezone, event_length):
+    """冲突说明缓存的时隙已过期：失效重叠的时隙缓存"""
+    logger.info(f"⚠️ Booking conflict for {date} {time} ({timezone})")
+    start = time_utils.local_epoch(date, time, timezone)
+    cal_cache.slots.invalidate_range(start, start + event_length * 60)
+
+def submit_booking(email, date, time, reason, timezone, event_type_id, event_length):
+    """提交预约请求（不检查可用性）"""
+    return run_flow(submit_booking_flow(email, date, time, reason, timezone, event_type_id, event_length))
+
+def submit_booking_flow(email, date, time, reason, timezone, event_type_id, event_length):
     try:
-        # 创建带时区的时间对象
-        user_tz = pytz.timezone(timezone)
-        naive_start = datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M")
-        start_dt = user_tz.localize(naive_start)
-        
-        # 根据事件类型时长计算结束时间
-        end_dt = start_dt + timedelta(minutes=event_length)
-        
-        # 转换为UTC
-        utc_start = start_dt.astimezone(pytz.utc).isoformat()
-        utc_end = end_dt.astimezone(pytz.utc).isoformat()
-        
-        payload = {
-            "eventTypeId": event_type_id,
-            "start": utc_start,
-            "end": utc_end,
-            "responses": {
-                "name": email.split('@')[0],
-                "email": email,
-                "notes": reason
-            },
-            "timeZone": timezone,
-            "language": "en",
-            "metadata": {}
-        }
-        
+        payload = booking_payload(email, date, time, reason, timezone, event_type_id, event_length)
         logger.info(f"📅 Booking {event_length}min event for {email} on {date} at {time} ({timezone})")
-        logger.info(f"📦 Payload: {json.dumps(payload, indent=2)}")
         
-        return make_request("POST", "bookings", data=payload)
+        result = yield Request("POST", "bookings", data=payload)
+        if "error" not in result:
+            yield from mirror_call(record_booking, result, payload)
+        return result
     except ValueError as ve:
         logger.error(f"❌ Value error: {str(ve)}")
         return {"error": "Invalid date/time format"}
@@ -1582,32 +2156,173 @@ def book_event(email, date, time, reason, timezone="UTC"):
         logger.error(f"❌ General error: {str(e)}")
         return {"error": f"Booking failed: {str(e)}"}
 
+def book_events(batch, timezone="UTC", max_workers=None):
+    """批量预订事件，结果按输入顺序返回
+    
+    batch 为字典列表（email, date, time, 可选 reason/timezone）。事件类型只解析一次，
+    每个时区的整个日期范围只获取一次时隙（各时区并发获取），之后以有限并发提交预约。
+    """
+    return run_flow(book_events_flow(batch, timezone, max_workers))
+
+def book_events_flow(batch, timezone="UTC", max_workers=None):
+    if not batch:
+        return []
+    event_type_id, event_length = yield from resolve_event_type_flow()
+    if not event_type_id:
+        return [{"error": "Failed to create default event type"} for _ in batch]
+    
+    results, groups = plan_bulk_bookings(batch, timezone)
+    spans = {tz: [item["date"] for _, item in items] for tz, items in groups.items()}
+    indexes = yield Parallel([
+        slot_index_flow(min(dates), max(dates), tz, event_type_id) for tz, dates in spans.items()
+    ])
+    pending = []
+    claimed = []
+    for (tz, items), index in zip(groups.items(), indexes):
+        for i, item in items:
+            error = claim_slot(index, item, event_length, claimed)
+            if error:
+                results[i] = error
+            else:
+                pending.append((i, item))
+    
+    logger.info(f"📦 Bulk booking {len(pending)}/{len(batch)} items with {event_length}min event type {event_type_id}")
+    submitted = yield Parallel([
+        submit_booking_flow(
+            item["email"], item["date"], item["time"], item["reason"],
+            item["timezone"], event_type_id, event_length,
+        )
+        for _, item in pending
+    ], max_workers or BULK_MAX_WORKERS)
+    for (i, _), result in zip(pending, submitted):
+        results[i] = result
+    return results
+
+def plan_bulk_bookings(batch, timezone="UTC"):
+    """校验批量预订条目并按时区分组，返回 (结果列表, {时区: [(序号, 条目)]})
+    
+    校验失败的条目直接在结果列表中填入错误，其余位置为None。
+    """
+    results = [None] * len(batch)
+    groups = {}
+    for i, raw in enumerate(batch):
+        item = {
+            "email": raw.get("email"),
+            "date": raw.get("date"),
+            "time": raw.get("time"),
+            "reason": raw.get("reason", ""),
+            "timezone": raw.get("timezone") or timezone,
+        }
+        missing = [field for field in ("email", "date", "time") if not item[field]]
+        if missing:
+            results[i] = {"error": f"Missing required fields: {', '.join(missing)}"}
+            continue
+        if not time_utils.is_valid_timezone(item["timezone"]):
+            results[i] = {"error": f"Invalid timezone: {item['timezone']}"}
+            continue
+        try:
+            item["start"] = time_utils.local_epoch(item["date"], item["time"], item["timezone"])
+        except ValueError:
+            results[i] = {"error": "Invalid date/time format"}
+            continue
+        groups.setdefault(item["timezone"], []).append((i, item))
+    return results, groups
+
+def claim_slot(index, item, event_length, claimed):
+    """检查条目的时隙是否可用且不与同一批次已占用的时间段重叠，可用时返回None
+    
+    claimed 为已占用的 (UTC开始, UTC结束) 区间列表，按开始时间排序，可用时插入本条目的区间。
+    """
+    start = item["start"]
+    end = start + event_length * 60
+    i = bisect_left(claimed, (start,))
+    overlaps = (i > 0 and claimed[i - 1][1] > start) or (i < len(claimed) and claimed[i][0] < end)
+    if overlaps or not slot_in_index(index, item["date"], item["time"], event_length, item["timezone"]):
+        return {"error": "Time slot not available"}
+    claimed.insert(i, (start, end))
+    return None
+
+
+
 
 
+def prefetch_user(email, timezone="UTC", days=PREFETCH_DAYS):
+    """在后台预热用户即将到来的预约、预约索引和未来 days 天的时隙缓存，返回对应的future列表
+    
+    预约列表按用户时区从今天开始获取，结果写入 cal_cache.booking_lists，之后相同条件的
+    list_events（聊天中的"我有哪些会议"）直接命中；预约索引未构建时再获取一次完整列表，
+    取消时的 find_booking_id 不必在关键路径上拉取全部历史。预热任务在单独的低优先级线程池中执行。
+    """
+    logger.info(f"🔮 Prefetching upcoming bookings and {days} days of slots for {email}")
+    user_today = datetime.now(time_utils.get_timezone(timezone)).date()
+    start_date = user_today.strftime("%Y-%m-%d")
+    futures = []
+    if cal_cache.booking_lists.get((email, timezone, start_date, None), cal_cache.versions.stamp(email)) is None:
+        futures.append(user_prefetch_pool.submit(
+            prefetch_task, "bookings", prefetch_upcoming_bookings, email, timezone, start_date
+        ))
+    if not cal_cache.bookings.is_loaded(email):
+        futures.append(user_prefetch_pool.submit(
+            prefetch_task, "booking index", prefetch_booking_index, email, timezone
+        ))
+    if days > 0:
+        end_date = (user_today + timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        futures.append(user_prefetch_pool.submit(
+            prefetch_task, "slots", get_available_slots_range, start_date, end_date, timezone
+        ))
+    return futures
+
+def prefetch_upcoming_bookings(email, timezone, start_date):
+    """获取从 start_date 开始的预约并写入预取缓存"""
+    # 先取版本戳：获取期间发生的预订/取消会使这次结果失效
+    version = cal_cache.versions.stamp(email)
+    result = list_events(email, timezone, start_date)
+    cal_cache.booking_lists.set((email, timezone, start_date, None), version, result)
+    return result
+
+def prefetch_booking_index(email, timezone):
+    """用一次完整列表构建预约索引（执行前索引已被其他请求构建时跳过）"""
+    if cal_cache.bookings.is_loaded(email):
+        return None
+    return list_events(email, timezone)
+
+def prefetch_task(name, fn, *args):
+    """执行一个预取任务，失败只记录日志"""
+    try:
+        return fn(*args)
+    except Exception as e:
+        logger.warning(f"⚠️ Prefetch of {name} failed: {str(e)}")
 
+def bookings_version(email):
+    """该邮箱预约数据的版本戳，预订或取消成功后改变"""
+    return cal_cache.versions.stamp(email)
 
 def find_booking_id(email, date, time, timezone="UTC"):
-    """根据邮箱、日期和时间查找预约ID"""
+    """根据邮箱、日期和时间查找预约ID（通过预约索引O(1)查找）"""
+    return run_flow(find_booking_id_flow(email, date, time, timezone))
+
+def find_booking_id_flow(email, date, time, timezone="UTC"):
     logger.info(f"🔍 Finding booking for {email} on {date} at {time}")
-    bookings = list_events(email, timezone)
-    if "error" in bookings:
+    try:
+        target = time_utils.local_epoch(date, time, timezone)
+    except ValueError as e:
+        logger.warning(f"⚠️ Error parsing date: {str(e)}")
         return None
     
-    for booking in bookings.get("bookings", []):
-        if booking.get("status") == "CANCELLED":
-            continue
-        if "local_start" in booking:
-            try:
-                # 解析本地时间
-                booking_time = datetime.strptime(booking["local_start"], "%Y-%m-%d %H:%M")
-                target_time = datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M")
-                
-                # 比较时间
-                if booking_time == target_time:
-                    return booking["id"]
-            except Exception as e:
-                logger.warning(f"⚠️ Error parsing date: {str(e)}")
-    return None
+    # 启用本地镜像时直接从镜像查找
+    if (yield from mirror_call(ensure_mirror_fresh, email)):
+        return (yield Blocking(booking_store.get_store().find_booking, (email, target)))
+    
+    # 首次查询（或索引过期）时通过一次列表请求构建索引
+    if not cal_cache.bookings.is_loaded(email):
+        yield from list_events_flow(email, timezone)
+    booking_id = cal_cache.bookings.lookup(email, target)
+    
+    # 未命中且索引不是刚构建的：可能有外部创建的预约，重建一次
+    if booking_id is None and cal_cache.bookings.age(email) > cal_cache.BOOKING_INDEX_MISS_REFRESH:
+        yield from list_events_flow(email, timezone)
+        booking_id = cal_cache.bookings.lookup(email, target)
+    return booking_id
 
 # 测试当前用户信息
 if __name__ == "__main__":
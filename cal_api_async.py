@@ -0,0 +1,293 @@
+# cal_api_async.py
+import asyncio
+import copy
+import logging
+import weakref
+
+import httpx
+
+import cal_api
+import cal_transport
+import time_utils
+from cal_flow import Request, Parallel, Spawn, Join, Blocking
+
+logger = logging.getLogger(__name__)
+
+# 每个事件循环一个共享的AsyncClient（httpx客户端不能跨事件循环使用）
+_clients = weakref.WeakKeyDictionary()
+# 每个事件循环中进行中的GET请求：key -> Task
+_inflight = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    """获取当前事件循环共享的异步HTTP客户端"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            headers=cal_api.HEADERS,
+            timeout=httpx.Timeout(cal_transport.READ_TIMEOUT, connect=cal_transport.CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=cal_transport.POOL_MAXSIZE,
+                max_keepalive_connections=cal_transport.POOL_MAXSIZE,
+            ),
+        )
+        _clients[loop] = client
+        logger.info(f"🔌 Async HTTP client ready (pool={cal_transport.POOL_MAXSIZE})")
+    return client
+
+
+async def aclose():
+    """关闭当前事件循环的异步客户端"""
+    loop = asyncio.get_running_loop()
+    client = _clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
+
+
+def loop_time():
+    return asyncio.get_running_loop().time()
+
+
+async def send(method, url, params=None, json=None):
+    """发送请求（与同步传输层共用熔断器、限流器和重试策略）"""
+    attempt = 0
+    while True:
+        if not cal_transport.breaker.allow():
+            raise cal_transport.CircuitOpenError(f"Cal.com circuit is {cal_transport.breaker.state}, failing fast")
+        wait = cal_transport.rate_limiter.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        started = loop_time()
+        try:
+            response = await get_client().request(method, url, params=params, json=json)
+        except BaseException as e:
+            if not isinstance(e, httpx.TransportError):
+                # 取消等非网络异常不计入熔断统计
+                cal_transport.breaker.record_neutral()
+                raise
+            before_send = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+            delay = cal_transport.retry_delay_for_error(method, attempt, before_send)
+            cal_transport.record_error(retrying=delay is not None)
+            if delay is None:
+                raise
+            logger.warning(f"🔁 {method} {url} failed ({type(e).__name__}), retry {attempt + 1} in {delay:.2f}s")
+        else:
+            delay = cal_transport.retry_delay_for_status(method, response.status_code, response.headers, attempt)
+            cal_transport.record_outcome(response.status_code, loop_time() - started, retrying=delay is not None)
+            if delay is None:
+                return response
+            if response.status_code == 429:
+                cal_transport.rate_limiter.pause(delay)
+            logger.warning(f"🔁 {method} {url} returned {response.status_code}, retry {attempt + 1} in {delay:.2f}s")
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+async def make_request(method, endpoint, params=None, data=None):
+    """统一处理API请求（异步版本，并发的相同GET请求合并为一次）"""
+    if method != "GET":
+        return await send_request(method, endpoint, params, data)
+
+    calls = _inflight.setdefault(asyncio.get_running_loop(), {})
+    key = cal_api.request_key(endpoint, params)
+    call = calls.get(key)
+    if call is not None:
+        logger.info(f"🤝 Coalesced GET {endpoint}")
+        call[1] += 1
+        return copy.deepcopy(await asyncio.shield(call[0]))
+
+    task = asyncio.ensure_future(send_request(method, endpoint, params, data))
+    call = calls[key] = [task, 0]  # [任务, 等待者数量]
+    task.add_done_callback(lambda _: calls.pop(key, None))
+    # shield：发起方被取消时不影响其他等待者
+    result = await asyncio.shield(task)
+    # 结果被共享时发起方也使用拷贝，任务中的结果保持不变
+    return copy.deepcopy(result) if call[1] else result
+
+
+async def send_request(method, endpoint, params=None, data=None):
+    """发送单个API请求"""
+    url, params = cal_api.prepare_request(method, endpoint, params, data)
+
+    try:
+        response = await send(method, url, params=params, json=data)
+        return cal_api.parse_response(response, url, params)
+    except cal_transport.CircuitOpenError as e:
+        logger.warning(f"⛔ {str(e)}")
+        return cal_api.CIRCUIT_OPEN_ERROR.copy()
+    except Exception as e:
+        error_msg = {"error": f"Request exception: {str(e)}"}
+        logger.exception(f"❌ Exception during request")
+        return error_msg
+
+
+async def run_flow(flow):
+    """异步驱动：执行 cal_api 中的编排流程（参见 cal_flow），业务逻辑与同步客户端共用
+
+    Spawn 的子流程作为任务在当前事件循环中执行，流程结束（或被取消）时未被 Join 的子流程会被取消。
+    """
+    spawned = []
+    value, error = None, None
+    try:
+        while True:
+            try:
+                effect = flow.throw(error) if error is not None else flow.send(value)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                value, error = await perform(effect, spawned), None
+            except Exception as e:
+                value, error = None, e
+    finally:
+        flow.close()
+        for task in spawned:
+            if not task.done():
+                task.cancel()
+
+
+async def perform(effect, spawned):
+    """在当前事件循环中执行一个流程操作"""
+    if isinstance(effect, Request):
+        return await make_request(effect.method, effect.endpoint, effect.params, effect.data)
+    if isinstance(effect, Parallel):
+        flows = list(effect.flows)
+        semaphore = asyncio.Semaphore(effect.limit or max(len(flows), 1))
+
+        async def run_one(flow):
+            async with semaphore:
+                return await run_flow(flow)
+
+        return await asyncio.gather(*[run_one(flow) for flow in flows])
+    if isinstance(effect, Spawn):
+        task = asyncio.ensure_future(run_flow(effect.flow))
+        spawned.append(task)
+        return task
+    if isinstance(effect, Join):
+        return await effect.handle
+    if isinstance(effect, Blocking):
+        return await asyncio.to_thread(effect.fn, *effect.args)
+    raise TypeError(f"Unknown flow effect: {effect!r}")
+
+
+async def get_current_user():
+    """获取当前用户信息（验证API密钥）"""
+    return await make_request("GET", "me")
+
+
+async def get_event_types(force_refresh=False):
+    """获取用户的所有事件类型（与同步客户端共用缓存）"""
+    return await run_flow(cal_api.event_types_flow(force_refresh))
+
+
+async def get_first_event_type():
+    """获取第一个事件类型及其时长"""
+    return await run_flow(cal_api.first_event_type_flow())
+
+
+async def get_event_length(event_type_id):
+    """获取事件类型的时长"""
+    return await run_flow(cal_api.event_length_flow(event_type_id))
+
+
+async def create_default_event_type():
+    """创建默认事件类型"""
+    return await run_flow(cal_api.create_default_event_type_flow())
+
+
+async def resolve_event_type():
+    """获取预订使用的事件类型ID和时长，没有则创建默认事件类型"""
+    return await run_flow(cal_api.resolve_event_type_flow())
+
+
+async def list_events(email, timezone="UTC", start_date=None, end_date=None, status=None, limit=None,
+                      max_staleness=None):
+    """根据邮箱列出事件（参见 cal_api.list_events）"""
+    return await run_flow(
+        cal_api.list_events_flow(email, timezone, start_date, end_date, status, limit, max_staleness)
+    )
+
+
+async def iter_events(email, timezone="UTC", start_date=None, end_date=None, status=None):
+    """逐页获取预约，惰性地产出已转换时区的结果（出错时抛出CalAPIError）"""
+    user_tz = time_utils.get_timezone(timezone)
+    window = cal_api.booking_window(start_date, end_date, timezone)
+    async for page_bookings in booking_pages(cal_api.bookings_params(email, window, status)):
+        for booking in cal_api.select_bookings(page_bookings, window, status):
+            yield cal_api.localize_booking(booking, user_tz)
+
+
+async def booking_pages(params):
+    """逐页获取原始预约列表，每页只产出之前未出现过的预约（出错时抛出CalAPIError）"""
+    seen = set()
+    page = 1
+    while True:
+        fresh, last = await run_flow(cal_api.booking_page_flow(params, page, seen))
+        yield fresh
+        if last:
+            return
+        page += 1
+
+
+async def cancel_event(booking_id):
+    """取消事件"""
+    return await run_flow(cal_api.cancel_event_flow(booking_id))
+
+
+async def cancel_events(email, start_date=None, end_date=None, status=None, timezone="UTC", max_workers=None):
+    """批量取消符合条件的预约（参见 cal_api.cancel_events）"""
+    return await run_flow(cal_api.cancel_events_flow(email, start_date, end_date, status, timezone, max_workers))
+
+
+async def cancel_bookings(booking_ids, max_workers=None):
+    """以有限并发取消给定的预约（参见 cal_api.cancel_bookings）"""
+    return await run_flow(cal_api.cancel_bookings_flow(booking_ids, max_workers))
+
+
+async def get_available_slots(date, timezone="UTC", event_type_id=None):
+    """获取指定日期的可用时隙（多日索引上的单日视图）"""
+    data = await get_available_slots_range(date, date, timezone, event_type_id)
+    return cal_api.slots_for_date(data, date)
+
+
+async def get_available_slots_range(start_date, end_date, timezone="UTC", event_type_id=None):
+    """一次请求获取日期范围内的可用时隙（与同步客户端共用缓存）"""
+    return (await load_slots(start_date, end_date, timezone, event_type_id))[0]
+
+
+async def get_slot_index(start_date, end_date, timezone="UTC", event_type_id=None):
+    """获取日期范围内预解析、已排序的时隙索引"""
+    return (await load_slots(start_date, end_date, timezone, event_type_id))[1]
+
+
+async def load_slots(start_date, end_date, timezone="UTC", event_type_id=None):
+    """获取时隙响应及其索引，优先使用缓存"""
+    return await run_flow(cal_api.load_slots_flow(start_date, end_date, timezone, event_type_id))
+
+
+async def is_slot_available(date, time, duration, timezone="UTC", event_type_id=None):
+    """检查特定时间段是否可用"""
+    index = await get_slot_index(date, date, timezone, event_type_id)
+    return cal_api.slot_in_index(index, date, time, duration, timezone)
+
+
+async def book_event(email, date, time, reason, timezone="UTC", optimistic=None, suggestions=0):
+    """预订新事件（optimistic/suggestions 参见 cal_api.book_event）"""
+    return await run_flow(cal_api.book_event_flow(email, date, time, reason, timezone, optimistic, suggestions))
+
+
+async def submit_booking(email, date, time, reason, timezone, event_type_id, event_length):
+    """提交预约请求（不检查可用性）"""
+    return await run_flow(
+        cal_api.submit_booking_flow(email, date, time, reason, timezone, event_type_id, event_length)
+    )
+
+
+async def book_events(batch, timezone="UTC", max_workers=None):
+    """批量预订事件，结果按输入顺序返回（参见 cal_api.book_events）"""
+    return await run_flow(cal_api.book_events_flow(batch, timezone, max_workers))
+
+
+async def find_booking_id(email, date, time, timezone="UTC"):
+    """根据邮箱、日期和时间查找预约ID（通过预约索引O(1)查找）"""
+    return await run_flow(cal_api.find_booking_id_flow(email, date, time, timezone))
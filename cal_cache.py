@@ -0,0 +1,320 @@
+# cal_cache.py
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 缓存有效期（秒），可通过环境变量覆盖
+EVENT_TYPE_TTL = float(os.getenv("CAL_EVENT_TYPE_TTL", "300"))
+SLOT_TTL = float(os.getenv("CAL_SLOT_TTL", "30"))
+BOOKING_INDEX_TTL = float(os.getenv("CAL_BOOKING_INDEX_TTL", "300"))
+BOOKING_LIST_TTL = float(os.getenv("CAL_BOOKING_LIST_TTL", "60"))  # 预取的预约列表的有效期
+BOOKING_INDEX_MISS_REFRESH = float(os.getenv("CAL_BOOKING_INDEX_MISS_REFRESH", "30"))  # 未命中时重建索引的最小间隔
+MAX_BOOKING_SPANS = 10000
+MAX_BOOKING_LISTS = 1000
+MAX_SLOT_ENTRIES = int(os.getenv("CAL_SLOT_CACHE_SIZE", "256"))  # 时隙缓存的最大条目数
+
+
+class EventTypeCache:
+    """进程内共享的事件类型缓存（带TTL和 id→时长 索引）"""
+
+    def __init__(self, ttl=EVENT_TYPE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = None
+        self._lengths = {}
+        self._expires_at = 0.0
+
+    def get(self):
+        """返回未过期的事件类型响应，过期或未缓存时返回None"""
+        with self._lock:
+            if self._data is not None and time.monotonic() < self._expires_at:
+                return self._data
+            return None
+
+    def set(self, data):
+        """缓存一次成功的事件类型响应"""
+        if not isinstance(data, dict) or "error" in data:
+            return
+        lengths = {
+            event["id"]: event.get("length", 30)
+            for event in data.get("event_types", [])
+            if isinstance(event, dict) and "id" in event
+        }
+        with self._lock:
+            self._data = data
+            self._lengths = lengths
+            self._expires_at = time.monotonic() + self.ttl
+        logger.info(f"🗂️ Cached {len(lengths)} event types for {self.ttl:.0f}s")
+
+    def length_of(self, event_type_id):
+        """从索引中查找事件类型时长，缓存失效或不存在时返回None"""
+        with self._lock:
+            if self._data is None or time.monotonic() >= self._expires_at:
+                return None
+            return self._lengths.get(event_type_id)
+
+    def invalidate(self):
+        """清空缓存（例如创建新事件类型之后）"""
+        with self._lock:
+            self._data = None
+            self._lengths = {}
+            self._expires_at = 0.0
+        logger.info("🗑️ Event type cache invalidated")
+
+
+class SlotCache:
+    """可用时隙缓存，键为 (username, eventTypeId, 开始日期, 结束日期, 时区)
+
+    每个条目保存原始响应和预解析的时隙索引，并记录其覆盖的UTC时间范围
+    （epoch秒），预订或取消成功后按时间重叠关系失效对应条目。
+    """
+
+    def __init__(self, ttl=SLOT_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}        # key -> (data, index, utc_start, utc_end, expires_at)
+        self._booking_spans = {}  # booking_id -> (utc_start, utc_end)
+
+    def get(self, key):
+        """返回未过期的 (响应, 索引)，没有则返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() >= entry[4]:
+                del self._entries[key]
+                return None
+            return entry[0], entry[1]
+
+    def set(self, key, data, index, utc_start, utc_end):
+        """缓存一次成功的时隙响应、时隙索引及其覆盖的UTC范围"""
+        if not isinstance(data, dict) or "error" in data:
+            return
+        with self._lock:
+            self._entries[key] = (data, index, utc_start, utc_end, time.monotonic() + self.ttl)
+            if len(self._entries) > MAX_SLOT_ENTRIES:
+                self._prune(time.monotonic())
+            while len(self._entries) > MAX_SLOT_ENTRIES:
+                # 仍然超出上限时丢弃最早写入的条目
+                self._entries.pop(next(iter(self._entries)))
+
+    def find_covering(self, username, event_type_id, timezone, start_date, end_date):
+        """查找覆盖 [start_date, end_date] 的未过期条目，返回 (响应, 索引)（日期为YYYY-MM-DD字符串）
+
+        扫描时顺带删除已过期的条目。
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            for key, (data, index, _, _, _) in self._entries.items():
+                k_user, k_type, k_start, k_end, k_tz = key
+                if (k_user, k_type, k_tz) == (username, event_type_id, timezone) \
+                        and k_start <= start_date and end_date <= k_end:
+                    return data, index
+        return None
+
+    def _prune(self, now):
+        """删除已过期的条目（调用方持有锁）"""
+        expired = [key for key, entry in self._entries.items() if entry[4] <= now]
+        for key in expired:
+            del self._entries[key]
+
+    def invalidate_range(self, utc_start, utc_end):
+        """失效所有与 [utc_start, utc_end) 重叠的条目"""
+        with self._lock:
+            stale = [
+                key for key, (_, _, start, end, _) in self._entries.items()
+                if start < utc_end and utc_start < end
+            ]
+            for key in stale:
+                del self._entries[key]
+        if stale:
+            logger.info(f"🗑️ Invalidated {len(stale)} cached slot ranges")
+        return len(stale)
+
+    def invalidate(self):
+        """清空所有时隙缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def note_booking(self, booking_id, utc_start, utc_end):
+        """记录预约的UTC时间范围，供取消时定位需要失效的条目"""
+        with self._lock:
+            self._booking_spans[booking_id] = (utc_start, utc_end)
+            if len(self._booking_spans) > MAX_BOOKING_SPANS:
+                self._booking_spans.pop(next(iter(self._booking_spans)))
+
+    def invalidate_booking(self, booking_id):
+        """按预约ID失效重叠条目；时间范围未知时清空全部缓存"""
+        with self._lock:
+            span = self._booking_spans.pop(booking_id, None)
+        if span is None:
+            self.invalidate()
+            return
+        self.invalidate_range(*span)
+
+
+class BookingIndex:
+    """预约索引：(邮箱, UTC开始分钟) → 预约ID
+
+    每个邮箱的索引由一次列表请求构建，之后在预订/取消成功时增量更新，
+    超过TTL后需要重新构建。
+    """
+
+    def __init__(self, ttl=BOOKING_INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._by_email = {}   # email -> {utc_minute: booking_id}
+        self._loaded_at = {}  # email -> 构建时间（monotonic）
+        self._keys = {}       # booking_id -> (email, utc_minute)
+
+    @staticmethod
+    def _normalize(email):
+        return (email or "").strip().lower()
+
+    def is_loaded(self, email):
+        """该邮箱的索引是否已构建且未过期"""
+        return self.age(email) < self.ttl
+
+    def age(self, email):
+        """该邮箱索引的构建时长（秒），未构建时返回无穷大"""
+        with self._lock:
+            loaded_at = self._loaded_at.get(self._normalize(email))
+        return float("inf") if loaded_at is None else time.monotonic() - loaded_at
+
+    def load(self, email, entries):
+        """用列表请求的结果重建该邮箱的索引，entries 为 (booking_id, utc_start_epoch) 序列"""
+        email = self._normalize(email)
+        with self._lock:
+            for minute, booking_id in self._by_email.pop(email, {}).items():
+                self._keys.pop(booking_id, None)
+            index = {}
+            for booking_id, utc_start in entries:
+                minute = int(utc_start // 60)
+                index[minute] = booking_id
+                self._keys[booking_id] = (email, minute)
+            self._by_email[email] = index
+            self._loaded_at[email] = time.monotonic()
+        logger.info(f"🗂️ Indexed {len(index)} bookings for {email}")
+
+    def add(self, email, booking_id, utc_start):
+        """记录新预约（仅在该邮箱索引已构建时更新）"""
+        email = self._normalize(email)
+        minute = int(utc_start // 60)
+        with self._lock:
+            index = self._by_email.get(email)
+            if index is None:
+                return
+            index[minute] = booking_id
+            self._keys[booking_id] = (email, minute)
+
+    def remove(self, booking_id):
+        """移除已取消的预约"""
+        with self._lock:
+            key = self._keys.pop(booking_id, None)
+            if key is None:
+                return
+            email, minute = key
+            index = self._by_email.get(email, {})
+            if index.get(minute) == booking_id:
+                del index[minute]
+
+    def email_of(self, booking_id):
+        """已索引预约所属的邮箱，未知时返回None"""
+        with self._lock:
+            key = self._keys.get(booking_id)
+        return key[0] if key else None
+
+    def lookup(self, email, utc_start):
+        """按邮箱和UTC开始时间（精确到分钟）查找预约ID"""
+        with self._lock:
+            return self._by_email.get(self._normalize(email), {}).get(int(utc_start // 60))
+
+    def invalidate(self, email=None):
+        """清空指定邮箱（或全部）的索引"""
+        with self._lock:
+            emails = [self._normalize(email)] if email else list(self._by_email)
+            for key in emails:
+                for booking_id in self._by_email.pop(key, {}).values():
+                    self._keys.pop(booking_id, None)
+                self._loaded_at.pop(key, None)
+
+
+class BookingListCache:
+    """后台预取的预约列表结果，键为 (邮箱, 时区, 开始日期, 结束日期)
+
+    只由预取写入，list_events 遇到完全相同的查询时直接返回；条目记录写入时的
+    预约版本戳，该邮箱的预约变更后或超过TTL后失效。
+    """
+
+    def __init__(self, ttl=BOOKING_LIST_TTL, max_entries=MAX_BOOKING_LISTS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> (result, version, expires_at)
+
+    def get(self, key, version):
+        """返回版本一致且未过期的结果，没有则返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] != version or time.monotonic() >= entry[2]:
+                del self._entries[key]
+                return None
+            return entry[0]
+
+    def set(self, key, version, result):
+        """缓存一次成功的列表结果，version 为发起请求前取得的版本戳"""
+        if not isinstance(result, dict) or "error" in result:
+            return
+        with self._lock:
+            self._entries[key] = (result, version, time.monotonic() + self.ttl)
+            while len(self._entries) > self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class BookingVersions:
+    """每个邮箱的预约版本号：该邮箱的预订/取消成功后递增
+
+    依赖预约列表的上层缓存把 stamp() 作为键的一部分，版本变化后旧条目自然失效。
+    无法确定邮箱的变更递增全局版本，使所有邮箱的版本同时变化。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._global = 0
+        self._by_email = {}
+
+    @staticmethod
+    def _normalize(email):
+        return (email or "").strip().lower()
+
+    def stamp(self, email):
+        """返回该邮箱当前的版本戳"""
+        with self._lock:
+            return self._global, self._by_email.get(self._normalize(email), 0)
+
+    def bump(self, email=None):
+        """记录一次预约变更（email 为空时递增全局版本）"""
+        with self._lock:
+            if email:
+                key = self._normalize(email)
+                self._by_email[key] = self._by_email.get(key, 0) + 1
+            else:
+                self._global += 1
+
+
+# 所有预订路径共用的缓存实例
+event_types = EventTypeCache()
+slots = SlotCache()
+bookings = BookingIndex()
+booking_lists = BookingListCache()
+versions = BookingVersions()
@@ -0,0 +1,22 @@
+# cal_flow.py
+from collections import namedtuple
+
+# Cal.com 预订编排（列表、预订、取消等）写成与传输层无关的生成器流程：
+# 流程通过 yield 下面的操作请求执行I/O，由驱动把结果送回流程。
+# 同步驱动（cal_api.run_flow）和异步驱动（cal_api_async.run_flow）执行同一份流程，
+# 因此两个客户端的业务逻辑只有一份。
+
+# 发送一个API请求，结果为 make_request 返回的字典
+Request = namedtuple("Request", ["method", "endpoint", "params", "data"], defaults=(None, None))
+
+# 并发执行多个子流程（limit 为最大并发数，None 表示不限），结果按输入顺序返回
+Parallel = namedtuple("Parallel", ["flows", "limit"], defaults=(None,))
+
+# 在后台启动一个子流程，结果为句柄；流程结束时仍未被 Join 的子流程会被取消
+Spawn = namedtuple("Spawn", ["flow"])
+
+# 等待 Spawn 启动的子流程，结果为其返回值（子流程的异常在此处重新抛出）
+Join = namedtuple("Join", ["handle"])
+
+# 执行一个阻塞调用（本地镜像的SQLite读写等），异步驱动会把它放到线程中执行
+Blocking = namedtuple("Blocking", ["fn", "args"], defaults=((),))
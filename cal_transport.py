@@ -0,0 +1,380 @@
+# cal_transport.py
+import os
+import copy
+import time
+import random
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# 连接池与超时配置（可通过环境变量覆盖）
+POOL_CONNECTIONS = int(os.getenv("CAL_POOL_CONNECTIONS", "4"))   # 缓存的主机连接池数量
+POOL_MAXSIZE = int(os.getenv("CAL_POOL_MAXSIZE", "32"))          # 每个主机保持的最大连接数
+CONNECT_TIMEOUT = float(os.getenv("CAL_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.getenv("CAL_READ_TIMEOUT", "15"))
+
+# 重试与退避配置
+MAX_RETRIES = int(os.getenv("CAL_MAX_RETRIES", "3"))
+BACKOFF_BASE = float(os.getenv("CAL_BACKOFF_BASE", "0.25"))       # 首次退避上限（秒），之后指数增长
+BACKOFF_MAX = float(os.getenv("CAL_BACKOFF_MAX", "8"))            # 单次退避上限（秒）
+MAX_RETRY_AFTER = float(os.getenv("CAL_MAX_RETRY_AFTER", "30"))   # Retry-After 超过该值时不再等待重试
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+# 进程级限流（令牌桶），CAL_RATE_LIMIT=0 表示不限流
+RATE_LIMIT = float(os.getenv("CAL_RATE_LIMIT", "10"))   # 每秒补充的令牌数
+RATE_BURST = float(os.getenv("CAL_RATE_BURST", "20"))   # 令牌桶容量
+
+# 熔断器配置
+BREAKER_FAILURES = int(os.getenv("CAL_BREAKER_FAILURES", "5"))                  # 连续失败多少次后熔断
+BREAKER_LATENCY_BUDGET = float(os.getenv("CAL_BREAKER_LATENCY_BUDGET", "5"))    # 超过该耗时（秒）的请求按失败计
+BREAKER_RESET_TIMEOUT = float(os.getenv("CAL_BREAKER_RESET_TIMEOUT", "30"))     # 熔断后多久进入半开状态试探
+BREAKER_HALF_OPEN_PROBES = int(os.getenv("CAL_BREAKER_HALF_OPEN_PROBES", "1"))  # 半开状态允许的并发试探请求数
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class TokenBucket:
+    """线程安全的令牌桶限流器，所有会话共享以控制对Cal.com的总请求速率"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """预留一个令牌，返回调用方需要等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+            return max(wait, self._paused_until - now)
+
+    def acquire(self):
+        """阻塞直到获得令牌"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """收到429时让所有调用方一起暂停"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+rate_limiter = TokenBucket(RATE_LIMIT, RATE_BURST)
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开时快速失败"""
+
+
+class CircuitBreaker:
+    """Cal.com后端熔断器
+
+    连续失败（5xx、网络错误或超出延迟预算，重试耗尽后才计一次）达到阈值后打开，打开期间直接拒绝请求；
+    超过重置时间后进入半开状态，只放行少量试探请求，成功则关闭，失败则重新打开。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=BREAKER_FAILURES, latency_budget=BREAKER_LATENCY_BUDGET,
+                 reset_timeout=BREAKER_RESET_TIMEOUT, half_open_probes=BREAKER_HALF_OPEN_PROBES):
+        self.failure_threshold = failure_threshold
+        self.latency_budget = latency_budget
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def allow(self):
+        """是否放行本次请求（放行的请求之后必须调用 record_success/record_failure）"""
+        with self._lock:
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probes = 0
+                logger.info("🟡 Circuit half-open, probing Cal.com")
+            if self._state == self.HALF_OPEN:
+                if self._probes >= self.half_open_probes:
+                    return False
+                self._probes += 1
+            return True
+
+    def record_success(self, latency=0.0):
+        """记录一次成功请求；超出延迟预算按失败处理"""
+        if latency > self.latency_budget:
+            logger.warning(f"🐢 Cal.com call took {latency:.2f}s (budget {self.latency_budget:.2f}s)")
+            self.record_failure()
+            return
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                logger.info("🟢 Circuit closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probes = 0
+
+    def record_failure(self):
+        """记录一次失败请求"""
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.error(f"🔴 Circuit opened after {self._failures} consecutive failures")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probes = 0
+
+    def record_neutral(self):
+        """请求既不算成功也不算失败（例如429限流），只释放半开试探名额"""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def reset(self):
+        """手动恢复到关闭状态"""
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probes = 0
+
+
+breaker = CircuitBreaker()
+
+
+def record_outcome(status_code, latency, retrying=False):
+    """按响应状态更新熔断器：5xx计为失败，429不计，其余按成功（含延迟预算检查）
+
+    retrying 为真表示本次尝试之后还会重试：熔断器按逻辑请求计数，中间尝试不计入，
+    只有最后一次尝试的结果才算成功或失败。
+    """
+    if retrying:
+        breaker.record_neutral()
+    elif status_code >= 500:
+        breaker.record_failure()
+    elif status_code == 429:
+        breaker.record_neutral()
+    else:
+        breaker.record_success(latency)
+
+
+def record_error(retrying=False):
+    """网络错误时更新熔断器（同 record_outcome，只计最后一次尝试）"""
+    if retrying:
+        breaker.record_neutral()
+    else:
+        breaker.record_failure()
+
+
+def retry_after_seconds(headers):
+    """解析 Retry-After 响应头（秒数或HTTP日期），没有时返回None"""
+    value = (headers or {}).get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt):
+    """带完全抖动的指数退避时间"""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+def retry_delay_for_status(method, status_code, headers, attempt):
+    """根据响应状态决定是否重试，返回等待秒数；不应重试时返回None
+
+    429 说明请求未被处理，任何方法都可以重试；5xx 只重试幂等方法，避免重复预订。
+    """
+    if attempt >= MAX_RETRIES or status_code not in RETRY_STATUSES:
+        return None
+    if status_code != 429 and method.upper() not in IDEMPOTENT_METHODS:
+        return None
+    retry_after = retry_after_seconds(headers)
+    if retry_after is not None:
+        if retry_after > MAX_RETRY_AFTER:
+            return None
+        return retry_after
+    return backoff_delay(attempt)
+
+
+def retry_delay_for_error(method, attempt, before_send):
+    """根据网络异常决定是否重试；非幂等方法只在请求确定未发出（连接阶段失败）时重试"""
+    if attempt >= MAX_RETRIES:
+        return None
+    if method.upper() not in IDEMPOTENT_METHODS and not before_send:
+        return None
+    return backoff_delay(attempt)
+
+
+class SingleFlight:
+    """合并并发的相同请求：同一时刻相同key只执行一次，其余调用方等待并共享结果
+
+    结果被共享时每个调用方（包括发起方）都拿到各自的深拷贝，调用方可以随意修改
+    （例如添加本地时间字段），不会影响其他调用方。
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+            self.waiters = 0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """执行 fn 或等待进行中的相同调用，返回 (结果, 是否为共享结果)"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            # call.result 在发起方和所有等待者之间保持不变，各自拷贝
+            return copy.deepcopy(call.result), True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                shared = call.waiters > 0
+            call.done.set()
+        return (copy.deepcopy(call.result) if shared else call.result), shared
+
+
+inflight = SingleFlight()
+
+
+def _build_session():
+    """创建带连接池和keep-alive的会话"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=0,  # 重试由调用方决定
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    # 不保存cookie，避免多线程共享会话时互相污染
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    logger.info(f"🔌 HTTP session ready (pool={POOL_MAXSIZE}, timeout={CONNECT_TIMEOUT}/{READ_TIMEOUT}s)")
+    return session
+
+
+def get_session():
+    """获取进程内共享的HTTP会话（线程安全，懒加载）"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def configure(pool_connections=None, pool_maxsize=None, connect_timeout=None, read_timeout=None):
+    """运行时调整连接池和超时配置，下一次请求时重建会话"""
+    global POOL_CONNECTIONS, POOL_MAXSIZE, CONNECT_TIMEOUT, READ_TIMEOUT
+    if pool_connections is not None:
+        POOL_CONNECTIONS = pool_connections
+    if pool_maxsize is not None:
+        POOL_MAXSIZE = pool_maxsize
+    if connect_timeout is not None:
+        CONNECT_TIMEOUT = connect_timeout
+    if read_timeout is not None:
+        READ_TIMEOUT = read_timeout
+    close()
+
+
+def close():
+    """关闭共享会话并释放连接"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def send(method, url, headers=None, params=None, json=None):
+    """通过共享会话发送请求（熔断 + 限流 + 带抖动的指数退避重试，遵循 Retry-After）
+
+    熔断器打开时抛出 CircuitOpenError。
+    """
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise CircuitOpenError(f"Cal.com circuit is {breaker.state}, failing fast")
+        rate_limiter.acquire()
+        started = time.monotonic()
+        try:
+            response = get_session().request(
+                method,
+                url,
+                headers=headers,
+                params=params,
+                json=json,
+                timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+            )
+        except Exception as e:
+            if not isinstance(e, (requests.ConnectionError, requests.Timeout)):
+                breaker.record_neutral()
+                raise
+            before_send = isinstance(e, requests.ConnectTimeout)
+            delay = retry_delay_for_error(method, attempt, before_send)
+            record_error(retrying=delay is not None)
+            if delay is None:
+                raise
+            logger.warning(f"🔁 {method} {url} failed ({type(e).__name__}), retry {attempt + 1} in {delay:.2f}s")
+        else:
+            delay = retry_delay_for_status(method, response.status_code, response.headers, attempt)
+            record_outcome(response.status_code, time.monotonic() - started, retrying=delay is not None)
+            if delay is None:
+                return response
+            if response.status_code == 429:
+                rate_limiter.pause(delay)
+            logger.warning(f"🔁 {method} {url} returned {response.status_code}, retry {attempt + 1} in {delay:.2f}s")
+        time.sleep(delay)
+        attempt += 1
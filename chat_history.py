@@ -0,0 +1,101 @@
+# chat_history.py
+import os
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# 发送给模型的历史记录的token预算（不含系统提示词和当前消息）
+TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))
+SUMMARY_MAX_CHARS = int(os.getenv("CHAT_SUMMARY_MAX_CHARS", "1500"))  # 压缩摘要的最大长度
+TRANSCRIPT_MAX = int(os.getenv("CHAT_TRANSCRIPT_MAX", "200"))         # UI显示保留的最大消息数
+SUMMARY_LINE_CHARS = 200  # 压缩时每条消息保留的最大字符数
+MIN_RECENT = 2            # 至少保留最近一轮完整对话
+
+
+def estimate_tokens(text):
+    """粗略估算token数（约4个字符一个token，外加每条消息的固定开销）"""
+    return len(text or "") // 4 + 4
+
+
+class ChatHistory:
+    """对话历史：只保存用户和助手消息（不含系统提示词）
+
+    相邻的重复消息会被合并；超出token预算的旧消息被压缩进一段摘要，
+    因此每轮发送给模型的历史大小保持稳定。
+    """
+
+    def __init__(self, token_budget=TOKEN_BUDGET, summary_max_chars=SUMMARY_MAX_CHARS,
+                 transcript_max=TRANSCRIPT_MAX):
+        self.token_budget = token_budget
+        self.summary_max_chars = summary_max_chars
+        self.transcript = deque(maxlen=transcript_max)  # 供UI显示的完整记录
+        self._recent = []   # 尚未压缩、原样发送给模型的消息
+        self._recent_tokens = 0
+        self._summary = ""
+
+    def append(self, role, content):
+        """追加一条消息，与上一条完全相同时忽略"""
+        if not content:
+            return
+        message = {"role": role, "content": content}
+        if self.transcript and self.transcript[-1] == message:
+            logger.info(f"🔁 Skipping duplicate {role} message")
+            return
+        self.transcript.append(message)
+        self._recent.append(message)
+        self._recent_tokens += estimate_tokens(content)
+        self._compact()
+
+    def add_turn(self, user_message, response):
+        """记录一轮完整的对话"""
+        self.append("user", user_message)
+        self.append("assistant", response)
+
+    def prompt_messages(self):
+        """发送给模型的历史消息：旧对话摘要 + 最近的原始消息"""
+        messages = []
+        if self._summary:
+            messages.append({
+                "role": "system",
+                "content": f"Summary of the earlier conversation:\n{self._summary}",
+            })
+        messages.extend(self._recent)
+        return messages
+
+    def prompt_tokens(self):
+        """prompt_messages() 的估算token数"""
+        summary_tokens = estimate_tokens(self._summary) if self._summary else 0
+        return self._recent_tokens + summary_tokens
+
+    def clear(self):
+        self.transcript.clear()
+        self._recent = []
+        self._recent_tokens = 0
+        self._summary = ""
+
+    def _compact(self):
+        """把超出预算的最旧消息压缩进摘要"""
+        folded = 0
+        while self.prompt_tokens() > self.token_budget and len(self._recent) > MIN_RECENT:
+            message = self._recent.pop(0)
+            self._recent_tokens -= estimate_tokens(message["content"])
+            self._fold(message)
+            folded += 1
+        if folded:
+            logger.info(f"🗜️ Compacted {folded} messages into history summary")
+
+    def _fold(self, message):
+        """把一条消息截断后追加到摘要，摘要超长时丢弃最旧的部分"""
+        content = " ".join(message["content"].split())
+        if len(content) > SUMMARY_LINE_CHARS:
+            content = content[:SUMMARY_LINE_CHARS] + "…"
+        line = f"{message['role'].capitalize()}: {content}"
+        summary = f"{self._summary}\n{line}" if self._summary else line
+        if len(summary) > self.summary_max_chars:
+            summary = summary[-self.summary_max_chars:]
+            # 从完整的一行开始
+            newline = summary.find("\n")
+            if newline != -1:
+                summary = summary[newline + 1:]
+        self._summary = summary
@@ -0,0 +1,78 @@
+# chat_usage.py
+import os
+import json
+import logging
+from collections import deque
+
+from chat_history import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# 每1000个token的价格（美元），默认按 gpt-4o 计价
+PROMPT_PRICE_PER_1K = float(os.getenv("OPENAI_PROMPT_PRICE_PER_1K", "0.0025"))
+COMPLETION_PRICE_PER_1K = float(os.getenv("OPENAI_COMPLETION_PRICE_PER_1K", "0.01"))
+MAX_TURNS = int(os.getenv("CHAT_USAGE_MAX_TURNS", "100"))  # 保留明细的最近轮数
+
+
+def cost_of(prompt_tokens, completion_tokens):
+    """按配置的单价估算费用（美元）"""
+    return prompt_tokens / 1000 * PROMPT_PRICE_PER_1K + completion_tokens / 1000 * COMPLETION_PRICE_PER_1K
+
+
+def estimate_messages(messages, functions=None):
+    """逐条估算请求中各消息（及函数定义）的token数"""
+    estimates = [{"role": m["role"], "tokens": estimate_tokens(m.get("content"))} for m in messages]
+    if functions:
+        estimates.append({"role": "functions", "tokens": estimate_tokens(json.dumps(functions))})
+    return estimates
+
+
+class UsageTracker:
+    """会话级的OpenAI用量统计：每轮明细、会话累计和按函数汇总"""
+
+    def __init__(self, max_turns=MAX_TURNS):
+        self.turns = deque(maxlen=max_turns)
+        self.totals = {"turns": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cost": 0.0}
+        self.by_function = {}
+
+    def record(self, usage, estimates=None, function=None):
+        """记录一次模型调用的 usage（OpenAI响应中的usage对象），返回本轮明细"""
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        turn = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "cost": cost_of(prompt_tokens, completion_tokens),
+            "function": function,
+            "estimated_prompt_tokens": sum(e["tokens"] for e in estimates or []),
+            "messages": estimates or [],
+        }
+        self.turns.append(turn)
+
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens", "cost"):
+            self.totals[key] += turn[key]
+        self.totals["turns"] += 1
+
+        name = function or "none"
+        stats = self.by_function.setdefault(
+            name, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cost": 0.0}
+        )
+        stats["calls"] += 1
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens", "cost"):
+            stats[key] += turn[key]
+
+        logger.info(
+            f"📊 Tokens: prompt={prompt_tokens} (est. {turn['estimated_prompt_tokens']}) "
+            f"completion={completion_tokens} function={name} | "
+            f"session total={self.totals['total_tokens']} cost=${self.totals['cost']:.4f}"
+        )
+        return turn
+
+    def summary(self):
+        """用量汇总：最近一轮、会话累计和按函数统计"""
+        return {
+            "last_turn": self.turns[-1] if self.turns else None,
+            "session": dict(self.totals),
+            "by_function": {name: dict(stats) for name, stats in self.by_function.items()},
+        }
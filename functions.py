@@ -21,7 +21,9 @@ def get_openai_function_definitions():
             "parameters": {
                 "type": "object",
                 "properties": {
-                    "email": {"type": "string", "description": "User's email address"}
+                    "email": {"type": "string", "description": "User's email address"},
+                    "start_date": {"type": "string", "description": "Only list events on or after this date (YYYY-MM-DD)"},
+                    "end_date": {"type": "string", "description": "Only list events on or before this date (YYYY-MM-DD)"}
                 },
                 "required": ["email"]
             }
@@ -38,8 +40,31 @@ def get_openai_function_definitions():
                 },
                 "required": ["email", "date", "time"]
             }
+        },
+        {
+            "name": "cancel_events",
+            "description": (
+                "Cancel all of the user's meetings in a date range (e.g. everything tomorrow). "
+                "Requires end_date or status. Call it first without confirm to list the matching meetings, "
+                "then with confirm=true only after the user explicitly agrees to cancel them."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "email": {"type": "string", "description": "User's email address"},
+                    "start_date": {"type": "string", "description": "Cancel meetings on or after this date (YYYY-MM-DD)"},
+                    "end_date": {"type": "string", "description": "Cancel meetings on or before this date (YYYY-MM-DD); required unless status is given"},
+                    "status": {"type": "string", "description": "Only cancel meetings with this status (e.g. ACCEPTED, PENDING); required unless end_date is given"},
+                    "confirm": {"type": "boolean", "description": "True only after the user confirmed the listed meetings should be canceled"}
+                },
+                "required": ["email"]
+            }
         }
     ]
 
+def get_openai_tool_definitions():
+    """同样的函数定义，包装为 tools 接口的格式"""
+    return [{"type": "function", "function": function} for function in get_openai_function_definitions()]
+
 if __name__ == "__main__":
     print(get_openai_function_definitions())
\ No newline at end of file
@@ -0,0 +1,122 @@
+# intent_parser.py
+import os
+import re
+import logging
+from datetime import datetime, timedelta
+
+import time_utils
+
+logger = logging.getLogger(__name__)
+
+# 规则解析快速通道（明确的请求不经过模型直接执行）
+ENABLED = os.getenv("CHAT_FAST_PATH", "true").lower() in ("1", "true", "yes")
+
+DATE_RE = re.compile(r"\b(\d{4}-\d{2}-\d{2})\b")
+RELATIVE_DATE_RE = re.compile(r"\b(today|tomorrow)\b", re.IGNORECASE)
+TIME_24H_RE = re.compile(r"\b([01]?\d|2[0-3]):([0-5]\d)\b(?!\s*[ap]\.?m\b)", re.IGNORECASE)
+TIME_12H_RE = re.compile(r"\b(1[0-2]|0?[1-9])(?::([0-5]\d))?\s*([ap])\.?m\b", re.IGNORECASE)
+REASON_RE = re.compile(r"\b(?:about|to discuss|regarding)\s+(.+)$", re.IGNORECASE)
+
+CANCEL_RE = re.compile(r"\bcancel\b", re.IGNORECASE)
+BOOK_RE = re.compile(r"\bbook\b|\bschedule\s+(?:a|an|me)\b", re.IGNORECASE)
+# 取消/预订只接受以祈使动词开头的命令（可带 please），例如 "cancel my meeting ..."
+COMMAND_RE = re.compile(r"^\W*(?:please\s+|pls\s+)?(?:cancel|book|schedule\s+(?:a|an|me))\b", re.IGNORECASE)
+# 疑问句或转述（"did you cancel ...?"、"remind me to book ..."）不是命令，不执行取消/预订
+QUESTION_RE = re.compile(
+    r"\?|\b(did|do|does|is|was|were|are|have|has|had|will|remind|reminder)\b", re.IGNORECASE
+)
+LIST_RE = re.compile(
+    r"\b(list|show|what|which|view|see)\b.*\b(meetings|events|bookings|schedule|calendar)\b", re.IGNORECASE
+)
+# 只支持 YYYY-MM-DD 和 today/tomorrow；出现其他日期说法（星期、月份、本周/下周、几天后、
+# 日期范围等）时，规则解析无法得出正确的日期范围，交给模型处理
+UNSUPPORTED_DATE_RE = re.compile(
+    r"\b(mon|tue|tues|wed|thu|thur|thurs|fri|sat|sun)(day)?\b|"
+    r"\b(jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)\b|"
+    r"\b(january|february|march|april|june|july|august|september|october|november|december)\b|"
+    r"\b(yesterday|tonight|morning|afternoon|evening|weekend|weekends|fortnight)\b|"
+    r"\b(days?|weeks?|months?|years?)\b|"
+    r"\b(this|next|last|past|previous|ago|later|soon)\b|"
+    r"\b(since|until|till|before|after|between|from|through|thru)\b|"
+    r"\b\d{1,2}(st|nd|rd|th)\b|\b\d{1,2}[/.]\d{1,2}([/.]\d{2,4})?\b",
+    re.IGNORECASE,
+)
+# 出现这些词时意图不够明确（否定、询问可行性、批量/改期），交给模型处理
+AMBIGUOUS_RE = re.compile(
+    r"\b(not|don't|dont|never|can i|could|should|would|how|why|all|every|everything|"
+    r"reschedule|move|change|instead|available|free|or)\b",
+    re.IGNORECASE,
+)
+
+
+def parse_dates(message, today=None):
+    """提取消息中的日期（YYYY-MM-DD 或 today/tomorrow），无效日期被忽略"""
+    today = today or datetime.now()
+    dates = []
+    for value in DATE_RE.findall(message):
+        try:
+            datetime.strptime(value, "%Y-%m-%d")
+            dates.append(value)
+        except ValueError:
+            continue
+    for word in RELATIVE_DATE_RE.findall(message):
+        offset = 1 if word.lower() == "tomorrow" else 0
+        dates.append((today + timedelta(days=offset)).strftime("%Y-%m-%d"))
+    return dates
+
+
+def parse_times(message):
+    """提取消息中的时间（14:00 或 2pm / 2:30 pm），统一为 HH:MM"""
+    times = [f"{int(h):02d}:{m}" for h, m in TIME_24H_RE.findall(message)]
+    for hour, minute, meridiem in TIME_12H_RE.findall(message):
+        hour = int(hour) % 12 + (12 if meridiem.lower() == "p" else 0)
+        times.append(f"{hour:02d}:{minute or '00'}")
+    return times
+
+
+def parse_reason(text):
+    """提取 "about .../to discuss ..." 形式的会议原因（去掉其中的日期和时间）"""
+    for pattern in (DATE_RE, RELATIVE_DATE_RE, TIME_12H_RE, TIME_24H_RE):
+        text = pattern.sub(" ", text)
+    match = REASON_RE.search(text)
+    if not match:
+        return None
+    reason = re.sub(r"(\s+(?:on|at))+\s*$", "", " ".join(match.group(1).split()))
+    return reason.rstrip(".!") or None
+
+
+def parse_intent(message, user_state):
+    """高置信度地解析明确的请求，返回 (函数名, 参数)；无法确定时返回None交给模型"""
+    if not user_state.email or AMBIGUOUS_RE.search(message):
+        return None
+
+    # 去掉邮箱，避免其中的数字被误认为日期/时间
+    text = re.sub(r"\S+@\S+", " ", message)
+    if UNSUPPORTED_DATE_RE.search(text):
+        return None
+    dates = parse_dates(text, datetime.now(time_utils.get_timezone(user_state.timezone)))
+    times = parse_times(text)
+    wants_cancel = bool(CANCEL_RE.search(text))
+    wants_book = bool(BOOK_RE.search(text))
+    if wants_cancel and wants_book:
+        return None
+
+    if wants_cancel or wants_book:
+        # 会修改预约的操作必须是明确的祈使句
+        if not COMMAND_RE.search(text) or QUESTION_RE.search(text):
+            return None
+        # 必须恰好给出一个日期和一个时间
+        if len(set(dates)) != 1 or len(set(times)) != 1:
+            return None
+        args = {"email": user_state.email, "date": dates[0], "time": times[0]}
+        if wants_cancel:
+            return "cancel_event", args
+        args["reason"] = parse_reason(text) or "Meeting"
+        return "book_event", args
+
+    if LIST_RE.search(text) and not times and len(set(dates)) <= 1:
+        args = {"email": user_state.email}
+        if dates:
+            args["start_date"] = args["end_date"] = dates[0]
+        return "list_events", args
+    return None
@@ -4,8 +4,14 @@ from openai import OpenAI
 from dotenv import load_dotenv
 import json
 import cal_api
+import time_utils
+from chat_history import ChatHistory
+from chat_usage import UsageTracker, estimate_messages
+import response_cache
+import intent_parser
 import re
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 # 设置日志
@@ -15,15 +21,37 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+# 同一轮中多个工具调用并发执行的线程数
+TOOL_WORKERS = int(os.getenv("CHAT_TOOL_WORKERS", "4"))
+tool_pool = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="chat-tools")
+
 class UserState:
     def __init__(self):
         self.email = None
         self.timezone = "America/Los_Angeles"  # 默认时区
         self.name = None
         self.last_interaction = datetime.now()
+        self.pending_cancellation = None  # 等待用户确认的批量取消：{"filters": 条件, "booking_ids": [ID]}
+    
+    @property
+    def timezone(self):
+        return self._timezone
+    
+    @timezone.setter
+    def timezone(self, value):
+        """设置时区时立即校验，避免等到预订时才失败"""
+        if not time_utils.is_valid_timezone(value):
+            raise ValueError(f"Unknown timezone: {value}")
+        self._timezone = value
+    
+    def today(self):
+        """用户时区的当前日期（YYYY-MM-DD），服务器时钟所在时区可能不同"""
+        return datetime.now(time_utils.get_timezone(self.timezone)).strftime("%Y-%m-%d")
     
     def update_from_message(self, message):
         """从消息中提取用户信息"""
+        previous_email = self.email
+        
         # 提取邮箱
         email_match = re.search(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', message)
         if email_match:
@@ -34,8 +62,11 @@ class UserState:
         if "timezone" in message.lower():
             tz_match = re.search(r'timezone:\s*(\S+)', message, re.IGNORECASE)
             if tz_match:
-                self.timezone = tz_match.group(1)
-                logger.info(f"🌍 Extracted timezone: {self.timezone}")
+                try:
+                    self.timezone = tz_match.group(1)
+                    logger.info(f"🌍 Extracted timezone: {self.timezone}")
+                except ValueError as e:
+                    logger.warning(f"⚠️ Ignoring invalid timezone: {str(e)}")
         
         # 提取姓名
         if "name" in message.lower():
@@ -44,12 +75,16 @@ class UserState:
                 self.name = name_match.group(1).strip()
                 logger.info(f"👤 Extracted name: {self.name}")
         
+        # 新邮箱：在模型思考的同时后台预取预约和可用时隙（时区可能在同一条消息中给出，放在最后）
+        if self.email and self.email != previous_email and cal_api.PREFETCH_ON_EMAIL:
+            cal_api.prefetch_user(self.email, self.timezone)
+        
         # 更新最后交互时间
         self.last_interaction = datetime.now()
 
 def parse_relative_date(user_message, user_state):
     """解析相对日期（如tomorrow）为具体日期"""
-    today = datetime.now()
+    today = datetime.strptime(user_state.today(), "%Y-%m-%d")  # 用户时区的今天
     
     if "today" in user_message.lower():
         return today.strftime("%Y-%m-%d")
@@ -61,207 +96,471 @@ def parse_relative_date(user_message, user_state):
     # 默认返回今天
     return today.strftime("%Y-%m-%d")
 
-def format_slot_times(slots, date):
-    """格式化可用时间段为友好的时间列表"""
-    formatted_slots = []
-    for slot in slots.get(date, []):
-        try:
-            # 解析ISO时间字符串
-            slot_time = datetime.fromisoformat(slot["start"])
-            # 格式化为HH:MM
-            formatted_slots.append(slot_time.strftime("%H:%M"))
-        except Exception as e:
-            logger.warning(f"⚠️ Error formatting slot time: {str(e)}")
-    
-    # 去重并排序
-    return sorted(set(formatted_slots))
-
-def handle_chat(user_message, chat_history):
-    from functions import get_openai_function_definitions
-    functions = get_openai_function_definitions()
-    user_state = chat_history.get("user_state", UserState())
-    
-    # 更新用户状态
+def update_user_state(user_message, chat_history):
+    """从消息中更新会话的用户状态"""
+    user_state = chat_history.setdefault("user_state", UserState())
     user_state.update_from_message(user_message)
+    return user_state
+
+def prepare_chat(user_message, chat_history):
+    """构建发送给模型的消息列表，返回 (messages, user_state)"""
+    user_state = chat_history.setdefault("user_state", UserState())
     
-    # 获取当前日期作为上下文
-    current_date = datetime.now().strftime("%Y-%m-%d")
+    # 获取当前日期作为上下文（按用户时区）
+    current_date = user_state.today()
     
     # 构建系统提示词 - 包含当前日期信息
     system_prompt = (
         f"You are a helpful meeting assistant. Today is {current_date}. "
         "When the user says 'tomorrow', calculate it as the day after today. "
         "If the user provides a relative time (like 'tomorrow'), use the current date to calculate the actual date. "
-        "Only ask for confirmation if absolutely necessary."
+        "Only ask for confirmation if absolutely necessary, except for cancel_events: "
+        "always show the user the matching meetings first and set confirm=true only after they agree."
     )
     
-    # 构建消息历史
+    # 构建消息历史（系统提示词不存入历史，历史按token预算压缩）
     messages = [{"role": "system", "content": system_prompt}]
-    messages.extend(chat_history.get("messages", []))
+    messages.extend(get_history(chat_history).prompt_messages())
     messages.append({"role": "user", "content": user_message})
     
     logger.info(f"💬 User message: {user_message}")
+    return messages, user_state
+
+def get_history(chat_history):
+    """获取会话的历史记录存储"""
+    return chat_history.setdefault("history", ChatHistory())
+
+def get_usage(chat_history):
+    """获取会话的用量统计（summary() 返回每轮、会话和按函数的汇总）"""
+    return chat_history.setdefault("usage", UsageTracker())
+
+def cache_key(user_message, chat_history):
+    """只读回复缓存的键，未启用缓存或邮箱未知时返回None"""
+    user_state = chat_history["user_state"]
+    email = user_state.email
+    if not response_cache.ENABLED or not email:
+        return None
+    return response_cache.responses.key(
+        user_message, email, user_state.timezone, user_state.today(), cal_api.bookings_version(email)
+    )
+
+def cache_response(key, response, chat_history):
+    """只缓存只读函数调用的成功回复"""
+    if key is not None and chat_history.get("last_function") in response_cache.CACHEABLE_FUNCTIONS \
+            and response and not response.startswith("❌"):
+        response_cache.responses.set(key, response)
+
+def fast_path(user_message, chat_history):
+    """规则解析出明确的意图时直接执行函数（跳过模型调用），否则返回None"""
+    if not intent_parser.ENABLED:
+        return None
+    user_state = chat_history["user_state"]
+    intent = intent_parser.parse_intent(user_message, user_state)
+    if intent is None:
+        return None
+    func_name, args = intent
+    logger.info(f"⚡ Fast path: {func_name}")
+    chat_history["last_function"] = func_name
+    return run_function_call(func_name, json.dumps(args), user_message, user_state)
+
+def handle_chat(user_message, chat_history):
+    update_user_state(user_message, chat_history)
+    key = cache_key(user_message, chat_history)
+    response = response_cache.responses.get(key) if key is not None else None
+    if response is not None:
+        logger.info(f"⚡ Response served from cache")
+    else:
+        response = fast_path(user_message, chat_history)
+        if response is None:
+            response = respond(user_message, chat_history)
+        cache_response(key, response, chat_history)
+    get_history(chat_history).add_turn(user_message, response)
+    return response
+
+def handle_chat_stream(user_message, chat_history):
+    """流式版本的 handle_chat：文本回复逐块产出，函数调用在增量拼接完成后执行并产出结果"""
+    update_user_state(user_message, chat_history)
+    key = cache_key(user_message, chat_history)
+    cached = response_cache.responses.get(key) if key is not None else None
+    parts = []
+    try:
+        if cached is not None:
+            logger.info(f"⚡ Response served from cache")
+            parts.append(cached)
+            yield cached
+            return
+        response = fast_path(user_message, chat_history)
+        if response is not None:
+            parts.append(response)
+            yield response
+        else:
+            for part in stream_response(user_message, chat_history):
+                parts.append(part)
+                yield part
+        cache_response(key, "".join(parts), chat_history)
+    finally:
+        # 即使中途停止读取，也记录已产出的部分
+        get_history(chat_history).add_turn(user_message, "".join(parts))
+
+def respond(user_message, chat_history):
+    """生成一轮回复（不记录历史）"""
+    from functions import get_openai_tool_definitions
+    tools = get_openai_tool_definitions()
+    messages, user_state = prepare_chat(user_message, chat_history)
+    chat_history["last_function"] = None
     
     # 调用OpenAI
     try:
         response = client.chat.completions.create(
             model="gpt-4o",
             messages=messages,
-            functions=functions,
-            function_call="auto"
+            tools=tools,
+            tool_choice="auto"
         )
 
         message = response.choices[0].message
-        logger.info(f"🤖 AI response: {message.content or 'Function call'}")
+        logger.info(f"🤖 AI response: {message.content or 'Tool calls'}")
         
         # 保存用户状态
         chat_history["user_state"] = user_state
-        chat_history["messages"] = messages
+        calls = [(call.id, call.function.name, call.function.arguments) for call in message.tool_calls or []]
+        get_usage(chat_history).record(
+            response.usage,
+            estimate_messages(messages, tools),
+            tool_names(calls)
+        )
         
-        if message.function_call:
-            func_name = message.function_call.name
-            logger.info(f"🔧 Function call: {func_name}")
-            
-            try:
-                args = json.loads(message.function_call.arguments)
-                logger.info(f"⚙️ Function arguments: {json.dumps(args, indent=2)}")
-                
-                # 自动填充用户邮箱
-                if "email" not in args and user_state.email:
-                    args["email"] = user_state.email
-                    logger.info(f"📧 Using stored email: {user_state.email}")
-                
-                # 特殊处理取消事件
-                if func_name == "cancel_event":
-                    if "email" not in args:
-                        return "Please provide your email address to cancel a meeting."
-                    if "date" not in args or "time" not in args:
-                        return "Please specify the date and time of the meeting to cancel."
-                    
-                    booking_id = cal_api.find_booking_id(
-                        args["email"], 
-                        args["date"], 
-                        args["time"]
-                    )
-                    if booking_id:
-                        result = cal_api.cancel_event(booking_id)
-                        if result and "error" not in result:
-                            response_text = f"✅ Your event on {args['date']} at {args['time']} has been canceled."
-                        else:
-                            response_text = "❌ Failed to cancel event. Please try again later."
-                    else:
-                        response_text = "❌ No matching event found."
-                
-                # 处理预订事件
-                elif func_name == "book_event":
-                    # 确保所有参数都存在
-                    if "email" not in args:
-                        return "Please provide your email address to book a meeting."
-                    if "date" not in args:
-                        # 尝试从用户消息中解析日期
-                        args["date"] = parse_relative_date(user_message, user_state)
-                        logger.info(f"📅 Auto-filled date: {args['date']}")
-                    if "time" not in args:
-                        return "Please specify the time for the meeting."
-                    if "reason" not in args:
-                        args["reason"] = "Meeting"  # 默认原因
-                    
-                    # 使用用户时区（如果已设置）
-                    timezone = user_state.timezone
-                    logger.info(f"⏰ Using timezone: {timezone}")
-                    
-                    result = cal_api.book_event(
-                        email=args["email"],
-                        date=args["date"],
-                        time=args["time"],
-                        reason=args["reason"],
-                        timezone=timezone
-                    )
-                    
-                    if "error" in result:
-                        error_msg = result["error"]
-                        
-                        # 处理时间不可用的情况
-                        if "Time slot not available" in error_msg:
-                            # 获取备选时间建议
-                            available_slots = cal_api.get_available_slots(args["date"], timezone)
-                            
-                            if "slots" in available_slots and args["date"] in available_slots["slots"]:
-                                slots = available_slots["slots"][args["date"]]
-                                # 格式化备选时间
-                                time_options = format_slot_times(available_slots["slots"], args["date"])
-                                
-                                if time_options:
-                                    # 只显示前5个选项
-                                    time_list = "\n".join([f"- {t}" for t in time_options[:5]])
-                                    response_text = (
-                                        f"❌ The requested time ({args['time']}) is not available. "
-                                        f"Here are some available times on {args['date']}:\n"
-                                        f"{time_list}\n"
-                                        f"Please choose one of these times."
-                                    )
-                                else:
-                                    response_text = "❌ The requested time is not available. Please choose a different time."
-                            else:
-                                response_text = "❌ The requested time is not available. Please choose a different time."
-                        
-                        # 处理其他错误
-                        else:
-                            response_text = f"❌ Booking failed: {error_msg}"
-                    else:
-                        booking = result.get("booking", {})
-                        if booking:
-                            response_text = (
-                                f"✅ Meeting booked!\n"
-                                f"Title: {booking.get('title', args['reason'])}\n"
-                                f"Date: {args['date']}\n"
-                                f"Time: {args['time']}"
-                            )
-                        else:
-                            response_text = "✅ Meeting booked! Details will be confirmed shortly."
-                
-                # 处理列出事件
-                elif func_name == "list_events":
-                    if "email" not in args and user_state.email:
-                        args["email"] = user_state.email
-                    
-                    if "email" not in args:
-                        return "Please provide your email address to view your events."
-                    
-                    result = cal_api.list_events(**args)
-                    if "error" in result:
-                        response_text = f"❌ Error: {result['error']}"
-                    else:
-                        events = result.get("bookings", [])
-                        if events:
-                            event_list = "\n".join([
-                                f"- {e['title']} on {e['startTime'].split('T')[0]} at {e['startTime'].split('T')[1][:5]}"
-                                for e in events
-                            ])
-                            response_text = f"📅 Your upcoming events:\n{event_list}"
-                        else:
-                            response_text = "📅 You have no upcoming events."
-                else:
-                    response_text = "❌ Unknown function requested"
-                
-                return response_text
-            
-            except Exception as e:
-                logger.exception(f"❌ Error during function execution")
-                return f"❌ Error: {str(e)}"
-        else:
+        if not calls:
             return message.content
+        
+        chat_history["last_function"] = tool_names(calls)
+        results = run_tool_calls(calls, user_message, user_state)
+        if len(results) == 1:
+            return results[0]
+        
+        # 多个工具调用：把全部结果交给模型，一次后续请求生成回复
+        followup_messages = messages + tool_messages(calls, results)
+        followup = client.chat.completions.create(
+            model="gpt-4o",
+            messages=followup_messages,
+            tools=tools,
+            tool_choice="none"
+        )
+        get_usage(chat_history).record(followup.usage, estimate_messages(followup_messages, tools), tool_names(calls))
+        return followup.choices[0].message.content
     
     except Exception as e:
         logger.exception(f"❌ Error during OpenAI call")
         return f"❌ Sorry, I encountered an error. Please try again."
 
+def stream_response(user_message, chat_history):
+    """流式生成一轮回复（不记录历史）"""
+    from functions import get_openai_tool_definitions
+    tools = get_openai_tool_definitions()
+    messages, user_state = prepare_chat(user_message, chat_history)
+    chat_history["last_function"] = None
+    
+    try:
+        stream = client.chat.completions.create(
+            model="gpt-4o",
+            messages=messages,
+            tools=tools,
+            tool_choice="auto",
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        
+        # 保存用户状态
+        chat_history["user_state"] = user_state
+        
+        pending = {}  # index -> [id, 函数名, 参数片段]
+        usage = None
+        for chunk in stream:
+            # 用量在最后一个（choices为空的）块中返回
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.tool_calls:
+                # id和函数名只在每个调用的第一个增量中出现，参数分散在后续增量中
+                for call in delta.tool_calls:
+                    entry = pending.setdefault(call.index, [None, None, []])
+                    if call.id:
+                        entry[0] = call.id
+                    if call.function and call.function.name:
+                        entry[1] = call.function.name
+                    if call.function and call.function.arguments:
+                        entry[2].append(call.function.arguments)
+            elif delta.content:
+                yield delta.content
+        
+        calls = [(call_id, name, "".join(parts)) for call_id, name, parts in (pending[i] for i in sorted(pending))]
+        get_usage(chat_history).record(usage, estimate_messages(messages, tools), tool_names(calls))
+        if not calls:
+            return
+        
+        chat_history["last_function"] = tool_names(calls)
+        results = run_tool_calls(calls, user_message, user_state)
+        if len(results) == 1:
+            yield results[0]
+            return
+        
+        # 多个工具调用：流式输出基于全部结果的后续回复
+        followup_messages = messages + tool_messages(calls, results)
+        followup = client.chat.completions.create(
+            model="gpt-4o",
+            messages=followup_messages,
+            tools=tools,
+            tool_choice="none",
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        usage = None
+        for chunk in followup:
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+        get_usage(chat_history).record(usage, estimate_messages(followup_messages, tools), tool_names(calls))
+    
+    except Exception as e:
+        logger.exception(f"❌ Error during OpenAI call")
+        yield f"❌ Sorry, I encountered an error. Please try again."
 
+def tool_names(calls):
+    """工具调用的函数名（多个时以+连接，相同的只保留一个），没有调用时返回None"""
+    names = sorted({name for _, name, _ in calls})
+    return "+".join(names) if names else None
 
+def run_tool_calls(calls, user_message, user_state):
+    """执行工具调用（calls 为 (id, 函数名, 参数JSON) 列表），多个调用并发执行，按原顺序返回结果"""
+    for _, name, _ in calls:
+        logger.info(f"🔧 Function call: {name}")
+    if len(calls) == 1:
+        _, name, arguments = calls[0]
+        return [run_function_call(name, arguments, user_message, user_state)]
+    futures = [
+        tool_pool.submit(run_function_call, name, arguments, user_message, user_state)
+        for _, name, arguments in calls
+    ]
+    return [future.result() for future in futures]
 
+def tool_messages(calls, results):
+    """把工具调用及其结果转换为后续请求的消息"""
+    messages = [{
+        "role": "assistant",
+        "content": None,
+        "tool_calls": [
+            {"id": call_id, "type": "function", "function": {"name": name, "arguments": arguments}}
+            for call_id, name, arguments in calls
+        ]
+    }]
+    messages.extend(
+        {"role": "tool", "tool_call_id": call_id, "content": result}
+        for (call_id, _, _), result in zip(calls, results)
+    )
+    return messages
 
+def run_function_call(func_name, arguments, user_message, user_state):
+    """执行模型请求的函数调用（arguments 为JSON字符串），返回回复文本"""
+    try:
+        args, prompt = prepare_arguments(func_name, arguments, user_message, user_state)
+        if prompt:
+            return prompt
+        
+        # 特殊处理取消事件
+        if func_name == "cancel_event":
+            booking_id = cal_api.find_booking_id(
+                args["email"], 
+                args["date"], 
+                args["time"],
+                user_state.timezone
+            )
+            result = cal_api.cancel_event(booking_id) if booking_id else None
+            return format_cancel_event(args, booking_id, result)
+        
+        # 批量取消事件：先列出匹配的预约，用户确认后才取消
+        elif func_name == "cancel_events":
+            booking_ids = confirmed_cancellation(args, user_state)
+            if booking_ids is not None:
+                return format_cancel_events(cal_api.cancel_bookings(booking_ids))
+            filters = cancel_events_kwargs(args, user_state)
+            return cancellation_preview(filters, cal_api.list_events(**filters), user_state)
+        
+        # 处理预订事件
+        elif func_name == "book_event":
+            return format_book_event(args, cal_api.book_event(**book_event_kwargs(args, user_state)))
+        
+        # 处理列出事件
+        else:
+            return format_list_events(cal_api.list_events(**list_events_kwargs(args, user_state)))
+    
+    except Exception as e:
+        logger.exception(f"❌ Error during function execution")
+        return f"❌ Error: {str(e)}"
 
+def prepare_arguments(func_name, arguments, user_message, user_state):
+    """解析并补全函数参数，返回 (args, None)；缺少必要信息时返回 (None, 提示文本)"""
+    if func_name not in ("cancel_event", "cancel_events", "book_event", "list_events"):
+        return None, "❌ Unknown function requested"
+    
+    args = json.loads(arguments or "{}")
+    logger.info(f"⚙️ Function arguments: {json.dumps(args, indent=2)}")
+    
+    # 自动填充用户邮箱
+    if "email" not in args and user_state.email:
+        args["email"] = user_state.email
+        logger.info(f"📧 Using stored email: {user_state.email}")
+    
+    if func_name == "cancel_event":
+        if "email" not in args:
+            return None, "Please provide your email address to cancel a meeting."
+        if "date" not in args or "time" not in args:
+            return None, "Please specify the date and time of the meeting to cancel."
+    
+    elif func_name == "cancel_events":
+        if "email" not in args:
+            return None, "Please provide your email address to cancel meetings."
+        # 不允许"今天以后全部取消"这类没有边界的批量取消
+        if not args.get("end_date") and not args.get("status"):
+            return None, "Please tell me the last date (or the status) of the meetings you want to cancel."
+    
+    elif func_name == "book_event":
+        # 确保所有参数都存在
+        if "email" not in args:
+            return None, "Please provide your email address to book a meeting."
+        if "date" not in args:
+            # 尝试从用户消息中解析日期
+            args["date"] = parse_relative_date(user_message, user_state)
+            logger.info(f"📅 Auto-filled date: {args['date']}")
+        if "time" not in args:
+            return None, "Please specify the time for the meeting."
+        if "reason" not in args:
+            args["reason"] = "Meeting"  # 默认原因
+    
+    elif func_name == "list_events":
+        if "email" not in args:
+            return None, "Please provide your email address to view your events."
+    
+    return args, None
+
+def cancel_events_kwargs(args, user_state):
+    """批量取消的参数：未指定开始日期时只取消（用户时区）今天及以后的会议"""
+    return {
+        "email": args["email"],
+        "start_date": args.get("start_date") or user_state.today(),
+        "end_date": args.get("end_date"),
+        "status": args.get("status"),
+        "timezone": user_state.timezone,
+    }
+
+def confirmed_cancellation(args, user_state):
+    """用户确认后的批量取消：返回之前预览过的预约ID；未确认或条件与预览不一致时返回None"""
+    pending = user_state.pending_cancellation
+    user_state.pending_cancellation = None
+    if args.get("confirm") and pending and pending["filters"] == cancel_events_kwargs(args, user_state):
+        return pending["booking_ids"]
+    if args.get("confirm"):
+        logger.warning("⚠️ Bulk cancellation confirmed without a matching preview, listing again")
+    return None
 
+def cancellation_preview(filters, selected, user_state):
+    """记录待确认的批量取消，返回列出匹配预约并请求确认的回复文本"""
+    if "error" in selected:
+        return f"❌ Error: {selected['error']}"
+    booking_ids = cal_api.cancellable_ids(selected)
+    if not booking_ids:
+        return "📅 No matching events to cancel."
+    user_state.pending_cancellation = {"filters": filters, "booking_ids": booking_ids}
+    event_list = "\n".join(
+        f"- {e.get('title', 'Meeting')} ({e.get('display_time', e.get('startTime'))})"
+        for e in selected["bookings"] if e.get("id") in booking_ids
+    )
+    return f"⚠️ This will cancel {len(booking_ids)} event(s):\n{event_list}\nShall I go ahead?"
+
+def book_event_kwargs(args, user_state):
+    """预订参数：使用用户时区，时隙不可用时附带备选时间（与预订并发预取，无需额外等待）"""
+    logger.info(f"⏰ Using timezone: {user_state.timezone}")
+    return {
+        "email": args["email"],
+        "date": args["date"],
+        "time": args["time"],
+        "reason": args["reason"],
+        "timezone": user_state.timezone,
+        "suggestions": 5,
+    }
+
+def list_events_kwargs(args, user_state):
+    """列表参数：只显示（用户时区）今天及以后的事件，日期按用户时区由服务器端过滤"""
+    return {
+        "email": args["email"],
+        "start_date": args.get("start_date") or user_state.today(),
+        "end_date": args.get("end_date"),
+        "timezone": user_state.timezone,
+    }
 
+def format_cancel_event(args, booking_id, result):
+    """取消单个事件的回复文本"""
+    if not booking_id:
+        return "❌ No matching event found."
+    if result and "error" not in result:
+        return f"✅ Your event on {args['date']} at {args['time']} has been canceled."
+    return "❌ Failed to cancel event. Please try again later."
 
+def format_cancel_events(result):
+    """批量取消的回复文本"""
+    if "error" in result:
+        return f"❌ Error: {result['error']}"
+    if not result["cancelled"] and not result["failed"]:
+        return "📅 No matching events to cancel."
+    response_text = f"✅ Canceled {len(result['cancelled'])} event(s)."
+    if result["failed"]:
+        response_text += f" ❌ Failed to cancel {len(result['failed'])} event(s). Please try again later."
+    return response_text
+
+def format_book_event(args, result):
+    """预订结果的回复文本"""
+    if "error" in result:
+        error_msg = result["error"]
+        
+        # 处理时间不可用的情况
+        if "Time slot not available" in error_msg:
+            time_options = result.get("suggestions", [])
+            
+            if time_options:
+                # 只显示前5个选项
+                time_list = "\n".join([f"- {t}" for t in time_options[:5]])
+                return (
+                    f"❌ The requested time ({args['time']}) is not available. "
+                    f"Here are some available times on {args['date']}:\n"
+                    f"{time_list}\n"
+                    f"Please choose one of these times."
+                )
+            return "❌ The requested time is not available. Please choose a different time."
+        
+        # 处理其他错误
+        return f"❌ Booking failed: {error_msg}"
+    
+    booking = result.get("booking", {})
+    if booking:
+        return (
+            f"✅ Meeting booked!\n"
+            f"Title: {booking.get('title', args['reason'])}\n"
+            f"Date: {args['date']}\n"
+            f"Time: {args['time']}"
+        )
+    return "✅ Meeting booked! Details will be confirmed shortly."
 
+def format_list_events(result):
+    """事件列表的回复文本"""
+    if "error" in result:
+        return f"❌ Error: {result['error']}"
+    events = result.get("bookings", [])
+    if events:
+        event_list = "\n".join([
+            f"- {e.get('title', 'Meeting')} ({e.get('display_time', e.get('startTime'))})"
+            for e in events
+        ])
+        return f"📅 Your upcoming events:\n{event_list}"
+    return "📅 You have no upcoming events."
@@ -0,0 +1,220 @@
+# openai_chatbot_async.py
+import os
+import re
+import json
+import asyncio
+import logging
+import threading
+import weakref
+
+from openai import AsyncOpenAI
+
+import cal_api
+import cal_api_async
+import cal_cache
+import openai_chatbot
+import response_cache
+import intent_parser
+from chat_usage import estimate_messages
+from functions import get_openai_tool_definitions
+
+logger = logging.getLogger(__name__)
+
+# 每个事件循环一个共享的AsyncOpenAI客户端（底层httpx客户端不能跨事件循环使用）
+_clients = weakref.WeakKeyDictionary()
+
+# 提到取消（cancel/cancelled/cancellation）的消息可能需要预约索引
+CANCEL_HINT_RE = re.compile(r"\bcancel", re.IGNORECASE)
+
+# 进行中的后台预取任务
+_prefetches = set()
+
+# 供同步代码（如Streamlit）使用的后台事件循环
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_client():
+    """获取当前事件循环的AsyncOpenAI客户端"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        _clients[loop] = client
+    return client
+
+
+async def aclose():
+    """关闭当前事件循环的客户端"""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+async def handle_chat(user_message, chat_history):
+    """异步版本的 handle_chat：模型调用和Cal.com调用都不阻塞事件循环
+
+    交给模型处理、且可能涉及取消的一轮，在模型调用的同时预取用户预约构建预约索引，
+    随后的 cancel_event 直接命中索引；预取在后台完成，不随本轮结束而取消。
+    启用 CAL_PREFETCH_ON_EMAIL 时预热已由 update_user_state 统一发起，这里不再重复获取。
+    """
+    user_state = openai_chatbot.update_user_state(user_message, chat_history)
+    key = openai_chatbot.cache_key(user_message, chat_history)
+    response = response_cache.responses.get(key) if key is not None else None
+    if response is not None:
+        logger.info(f"⚡ Response served from cache")
+    else:
+        response = await fast_path(user_message, chat_history)
+        if response is None:
+            if may_need_index(user_message, chat_history):
+                start_prefetch(user_state)
+            response = await respond(user_message, chat_history)
+        openai_chatbot.cache_response(key, response, chat_history)
+    openai_chatbot.get_history(chat_history).add_turn(user_message, response)
+    return response
+
+
+def run_chat(user_message, chat_history, timeout=None):
+    """在后台事件循环中执行 handle_chat 并等待结果（供Streamlit等同步代码调用）
+
+    后台循环在进程内共享，AsyncOpenAI和Cal.com客户端的连接池可以跨请求复用。
+    """
+    future = asyncio.run_coroutine_threadsafe(handle_chat(user_message, chat_history), background_loop())
+    return future.result(timeout)
+
+
+def background_loop():
+    """获取（必要时启动）后台事件循环"""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="chat-async", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def may_need_index(user_message, chat_history):
+    """本轮是否可能需要预约索引：消息或上一条回复提到取消（如模型在追问要取消哪个会议）"""
+    transcript = openai_chatbot.get_history(chat_history).transcript
+    previous = transcript[-1]["content"] if transcript else ""
+    return bool(CANCEL_HINT_RE.search(user_message) or CANCEL_HINT_RE.search(previous))
+
+
+def start_prefetch(user_state):
+    """在后台预取用户预约（索引已构建或由 CAL_PREFETCH_ON_EMAIL 预热时跳过）"""
+    if not user_state.email or cal_api.PREFETCH_ON_EMAIL or cal_cache.bookings.is_loaded(user_state.email):
+        return
+    task = asyncio.ensure_future(prefetch_bookings(user_state))
+    # 保留任务引用直到完成，避免被垃圾回收
+    _prefetches.add(task)
+    task.add_done_callback(_prefetches.discard)
+
+
+async def prefetch_bookings(user_state):
+    """预取用户的预约以构建预约索引（索引未过期时跳过）"""
+    if cal_cache.bookings.is_loaded(user_state.email):
+        return
+    try:
+        await cal_api_async.list_events(user_state.email, user_state.timezone)
+    except Exception as e:
+        logger.warning(f"⚠️ Booking prefetch failed: {str(e)}")
+
+
+async def fast_path(user_message, chat_history):
+    """规则解析出明确的意图时直接执行函数（跳过模型调用），否则返回None"""
+    if not intent_parser.ENABLED:
+        return None
+    user_state = chat_history["user_state"]
+    intent = intent_parser.parse_intent(user_message, user_state)
+    if intent is None:
+        return None
+    func_name, args = intent
+    logger.info(f"⚡ Fast path: {func_name}")
+    chat_history["last_function"] = func_name
+    return await run_function_call(func_name, json.dumps(args), user_message, user_state)
+
+
+async def respond(user_message, chat_history):
+    """生成一轮回复（不记录历史）"""
+    tools = get_openai_tool_definitions()
+    messages, user_state = openai_chatbot.prepare_chat(user_message, chat_history)
+    chat_history["last_function"] = None
+    client = get_client()
+
+    try:
+        response = await client.chat.completions.create(
+            model="gpt-4o",
+            messages=messages,
+            tools=tools,
+            tool_choice="auto"
+        )
+
+        message = response.choices[0].message
+        logger.info(f"🤖 AI response: {message.content or 'Tool calls'}")
+        calls = [(call.id, call.function.name, call.function.arguments) for call in message.tool_calls or []]
+        usage = openai_chatbot.get_usage(chat_history)
+        usage.record(response.usage, estimate_messages(messages, tools), openai_chatbot.tool_names(calls))
+
+        if not calls:
+            return message.content
+
+        chat_history["last_function"] = openai_chatbot.tool_names(calls)
+        for _, name, _ in calls:
+            logger.info(f"🔧 Function call: {name}")
+        results = await asyncio.gather(*[
+            run_function_call(name, arguments, user_message, user_state) for _, name, arguments in calls
+        ])
+        if len(results) == 1:
+            return results[0]
+
+        # 多个工具调用：把全部结果交给模型，一次后续请求生成回复
+        followup_messages = messages + openai_chatbot.tool_messages(calls, results)
+        followup = await client.chat.completions.create(
+            model="gpt-4o",
+            messages=followup_messages,
+            tools=tools,
+            tool_choice="none"
+        )
+        usage.record(followup.usage, estimate_messages(followup_messages, tools), openai_chatbot.tool_names(calls))
+        return followup.choices[0].message.content
+
+    except Exception as e:
+        logger.exception(f"❌ Error during OpenAI call")
+        return f"❌ Sorry, I encountered an error. Please try again."
+
+
+async def run_function_call(func_name, arguments, user_message, user_state):
+    """执行函数调用（异步Cal.com客户端），参数处理和回复文本与同步版本共用"""
+    try:
+        args, prompt = openai_chatbot.prepare_arguments(func_name, arguments, user_message, user_state)
+        if prompt:
+            return prompt
+
+        if func_name == "cancel_event":
+            booking_id = await cal_api_async.find_booking_id(
+                args["email"], args["date"], args["time"], user_state.timezone
+            )
+            result = await cal_api_async.cancel_event(booking_id) if booking_id else None
+            return openai_chatbot.format_cancel_event(args, booking_id, result)
+
+        elif func_name == "cancel_events":
+            booking_ids = openai_chatbot.confirmed_cancellation(args, user_state)
+            if booking_ids is not None:
+                return openai_chatbot.format_cancel_events(await cal_api_async.cancel_bookings(booking_ids))
+            filters = openai_chatbot.cancel_events_kwargs(args, user_state)
+            selected = await cal_api_async.list_events(**filters)
+            return openai_chatbot.cancellation_preview(filters, selected, user_state)
+
+        elif func_name == "book_event":
+            result = await cal_api_async.book_event(**openai_chatbot.book_event_kwargs(args, user_state))
+            return openai_chatbot.format_book_event(args, result)
+
+        else:
+            result = await cal_api_async.list_events(**openai_chatbot.list_events_kwargs(args, user_state))
+            return openai_chatbot.format_list_events(result)
+
+    except Exception as e:
+        logger.exception(f"❌ Error during function execution")
+        return f"❌ Error: {str(e)}"
@@ -0,0 +1,67 @@
+# response_cache.py
+import os
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# 只读意图的回复缓存（默认关闭）
+ENABLED = os.getenv("CHAT_RESPONSE_CACHE", "false").lower() in ("1", "true", "yes")
+TTL = float(os.getenv("CHAT_RESPONSE_CACHE_TTL", "300"))
+MAX_ENTRIES = int(os.getenv("CHAT_RESPONSE_CACHE_SIZE", "256"))
+
+# 结果可以缓存的只读函数
+CACHEABLE_FUNCTIONS = {"list_events"}
+
+
+def normalize_message(message):
+    """规范化用户消息：小写、去掉问号/感叹号/逗号、合并空白、去掉末尾句号"""
+    message = re.sub(r"[?!,？！，]", " ", (message or "").lower())
+    return re.sub(r"\s+", " ", message).strip().rstrip(".。 ")
+
+
+class ResponseCache:
+    """按 (规范化消息, 邮箱, 时区, 日期, 预约版本) 缓存只读函数调用的回复（LRU + TTL）
+
+    回复中的时间按用户时区显示，时区改变后不能复用之前的回复。
+    """
+
+    def __init__(self, ttl=TTL, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (response, expires_at)
+
+    @staticmethod
+    def key(message, email, timezone, today, version):
+        return normalize_message(message), (email or "").strip().lower(), timezone, today, version
+
+    def get(self, key):
+        """返回未过期的缓存回复，没有则返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() >= entry[1]:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, response):
+        with self._lock:
+            self._entries[key] = (response, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# 所有会话共用的缓存实例
+responses = ResponseCache()
@@ -0,0 +1,64 @@
+# slot_index.py
+from bisect import bisect_left, bisect_right
+
+
+class SlotIndex:
+    """按日期组织的可用时隙索引
+
+    每个日期对应一个已排序的UTC epoch秒列表，时隙字符串只在构建时解析一次，
+    之后的查询都通过二分查找完成（O(log n)）。
+    """
+
+    def __init__(self, by_date=None):
+        self._by_date = {date: sorted(starts) for date, starts in (by_date or {}).items()}
+
+    @classmethod
+    def from_response(cls, data, parse):
+        """从按日期索引的时隙响应构建索引，parse 把时隙字符串转换为带时区的datetime"""
+        by_date = {}
+        for date, slots in (data.get("slots") or {}).items():
+            starts = by_date.setdefault(date, [])
+            for slot in slots:
+                slot_time = slot.get("time") if isinstance(slot, dict) else None
+                slot_dt = parse(slot_time) if slot_time else None
+                if slot_dt is not None:
+                    starts.append(int(slot_dt.timestamp()))
+        return cls(by_date)
+
+    def dates(self):
+        """索引中包含的日期（已排序）"""
+        return sorted(self._by_date)
+
+    def starts(self, date):
+        """指定日期的全部时隙开始时间（UTC epoch秒，已排序）"""
+        return self._by_date.get(date, [])
+
+    def contains(self, date, start):
+        """是否存在恰好从 start 开始的时隙"""
+        starts = self.starts(date)
+        i = bisect_left(starts, start)
+        return i < len(starts) and starts[i] == start
+
+    def covers(self, date, start, duration, slot_length):
+        """是否存在一个时隙完整覆盖 [start, start+duration)（单位：秒）"""
+        starts = self.starts(date)
+        i = bisect_right(starts, start) - 1
+        return i >= 0 and starts[i] + slot_length >= start + duration
+
+    def nearest(self, date, target, count=5):
+        """距离 target 最近的 count 个时隙，按时间先后返回"""
+        starts = self.starts(date)
+        right = bisect_left(starts, target)
+        left = right - 1
+        picked = []
+        while len(picked) < count and (left >= 0 or right < len(starts)):
+            if right >= len(starts) or (left >= 0 and target - starts[left] <= starts[right] - target):
+                picked.append(starts[left])
+                left -= 1
+            else:
+                picked.append(starts[right])
+                right += 1
+        return sorted(picked)
+
+    def __len__(self):
+        return sum(len(starts) for starts in self._by_date.values())
@@ -0,0 +1,263 @@
+# tests/test_flow_drivers.py
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("CAL_API_KEY", "cal_test_key")
+
+import cal_api
+import cal_api_async
+from cal_flow import Blocking, Join, Parallel, Request, Spawn
+
+
+class Tracker:
+    """记录并发的请求数"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+
+    def enter(self):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+
+    def exit(self):
+        with self.lock:
+            self.active -= 1
+
+
+class SyncDriver:
+    name = "sync"
+
+    def __init__(self, monkeypatch, tracker):
+        def make_request(method, endpoint, params=None, data=None):
+            params = params or {}
+            tracker.enter()
+            try:
+                time.sleep(params.get("delay", 0))
+                if "error" in params:
+                    raise ValueError(params["error"])
+                return {"value": params.get("value")}
+            finally:
+                tracker.exit()
+
+        monkeypatch.setattr(cal_api, "make_request", make_request)
+
+    def run(self, flow, after=None):
+        result = cal_api.run_flow(flow)
+        if after is not None:
+            after(result)
+        return result
+
+
+class AsyncDriver:
+    name = "async"
+
+    def __init__(self, monkeypatch, tracker):
+        async def make_request(method, endpoint, params=None, data=None):
+            params = params or {}
+            tracker.enter()
+            try:
+                await asyncio.sleep(params.get("delay", 0))
+                if "error" in params:
+                    raise ValueError(params["error"])
+                return {"value": params.get("value")}
+            finally:
+                tracker.exit()
+
+        monkeypatch.setattr(cal_api_async, "make_request", make_request)
+
+    def run(self, flow, after=None):
+        async def main():
+            result = await cal_api_async.run_flow(flow)
+            # 让被取消的子流程完成取消，再在事件循环关闭前检查状态
+            await asyncio.sleep(0)
+            if after is not None:
+                after(result)
+            return result
+
+        return asyncio.run(main())
+
+
+@pytest.fixture
+def tracker():
+    return Tracker()
+
+
+@pytest.fixture(params=[SyncDriver, AsyncDriver], ids=["sync", "async"])
+def driver(request, monkeypatch, tracker):
+    return request.param(monkeypatch, tracker)
+
+
+def fetch(value, delay=0):
+    response = yield Request("GET", "test", {"value": value, "delay": delay})
+    return response["value"]
+
+
+def fail(message):
+    yield Request("GET", "test", {"error": message})
+
+
+def test_request_result_is_sent_back(driver):
+    def flow():
+        first = yield from fetch(1)
+        second = yield from fetch(first + 1)
+        return [first, second]
+
+    assert driver.run(flow()) == [1, 2]
+
+
+def test_request_error_is_thrown_into_flow(driver):
+    def flow():
+        try:
+            yield from fail("boom")
+        except ValueError as e:
+            return f"caught {e}"
+
+    assert driver.run(flow()) == "caught boom"
+
+
+def test_uncaught_error_propagates_and_closes_flow(driver):
+    closed = []
+
+    def flow():
+        try:
+            yield from fail("boom")
+        finally:
+            closed.append(True)
+
+    with pytest.raises(ValueError, match="boom"):
+        driver.run(flow())
+    assert closed == [True]
+
+
+def test_unknown_effect_raises_type_error_in_flow(driver):
+    def flow():
+        try:
+            yield "not an effect"
+        except TypeError:
+            return "rejected"
+
+    assert driver.run(flow()) == "rejected"
+
+
+def test_spawn_and_join(driver):
+    def flow():
+        handle = yield Spawn(fetch("background", 0.02))
+        foreground = yield from fetch("foreground")
+        background = yield Join(handle)
+        return [foreground, background]
+
+    assert driver.run(flow()) == ["foreground", "background"]
+
+
+def test_join_rethrows_spawned_error(driver):
+    def flow():
+        handle = yield Spawn(fail("spawned"))
+        try:
+            yield Join(handle)
+        except ValueError as e:
+            return f"caught {e}"
+
+    assert driver.run(flow()) == "caught spawned"
+
+
+def test_unjoined_spawn_is_cancelled(driver, monkeypatch):
+    gate = threading.Event()
+    states = []
+    if driver.name == "sync":
+        # 单线程池被占用，子流程停在队列中，流程结束时应被取消
+        pool = ThreadPoolExecutor(max_workers=1)
+        pool.submit(gate.wait)
+        monkeypatch.setattr(cal_api, "prefetch_pool", pool)
+
+    def flow():
+        handle = yield Spawn(fetch("never", 10))
+        return handle
+
+    try:
+        driver.run(flow(), after=lambda handle: states.append(handle.cancelled()))
+    finally:
+        gate.set()
+    assert states == [True]
+
+
+def test_parallel_results_keep_input_order(driver):
+    def flow():
+        return (yield Parallel([fetch(i, (5 - i) * 0.01) for i in range(5)]))
+
+    assert driver.run(flow()) == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.parametrize("limit", [1, 2])
+def test_parallel_respects_limit(driver, tracker, limit):
+    def flow():
+        return (yield Parallel([fetch(i, 0.03) for i in range(6)], limit))
+
+    assert driver.run(flow()) == list(range(6))
+    assert tracker.peak == limit
+
+
+def test_parallel_runs_flows_concurrently(driver, tracker):
+    def flow():
+        return (yield Parallel([fetch(i, 0.05) for i in range(4)]))
+
+    driver.run(flow())
+    assert tracker.peak > 1
+
+
+def test_parallel_error_is_thrown_into_flow(driver):
+    def flow():
+        try:
+            yield Parallel([fetch(1), fail("child")])
+        except ValueError as e:
+            return f"caught {e}"
+
+    assert driver.run(flow()) == "caught child"
+
+
+def test_blocking_result_and_error(driver):
+    def boom():
+        raise KeyError("blocking")
+
+    def flow():
+        total = yield Blocking(sum, ([1, 2, 3],))
+        try:
+            yield Blocking(boom)
+        except KeyError:
+            return total
+
+    assert driver.run(flow()) == 6
+
+
+def test_async_blocking_runs_off_event_loop(monkeypatch, tracker):
+    AsyncDriver(monkeypatch, tracker)
+    calls = []
+
+    def blocking():
+        try:
+            asyncio.get_running_loop()
+            in_loop = True
+        except RuntimeError:
+            in_loop = False
+        calls.append((threading.get_ident(), in_loop))
+        return "done"
+
+    async def main():
+        def flow():
+            return (yield Blocking(blocking))
+
+        return await cal_api_async.run_flow(flow()), threading.get_ident()
+
+    result, loop_thread = asyncio.run(main())
+    assert result == "done"
+    assert calls[0][0] != loop_thread
+    assert calls[0][1] is False
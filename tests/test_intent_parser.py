@@ -0,0 +1,139 @@
+# tests/test_intent_parser.py
+import os
+import sys
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import intent_parser
+import time_utils
+
+EMAIL = "alice@example.com"
+
+
+def user(email=EMAIL, timezone="UTC"):
+    return SimpleNamespace(email=email, timezone=timezone)
+
+
+def local_date(timezone, days=0):
+    now = datetime.now(time_utils.get_timezone(timezone))
+    return (now + timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def test_cancel_with_date_and_time():
+    assert intent_parser.parse_intent("cancel my meeting 2030-01-02 at 14:00", user()) == (
+        "cancel_event", {"email": EMAIL, "date": "2030-01-02", "time": "14:00"}
+    )
+
+
+def test_book_with_12h_time_and_reason():
+    assert intent_parser.parse_intent("book a meeting 2030-01-02 at 9am about budget review", user()) == (
+        "book_event", {"email": EMAIL, "date": "2030-01-02", "time": "09:00", "reason": "budget review"}
+    )
+
+
+def test_book_defaults_reason():
+    assert intent_parser.parse_intent("Book 2030-01-02 2:30 pm", user()) == (
+        "book_event", {"email": EMAIL, "date": "2030-01-02", "time": "14:30", "reason": "Meeting"}
+    )
+
+
+def test_tomorrow_uses_user_timezone():
+    tz = "Pacific/Kiritimati"
+    assert intent_parser.parse_intent("cancel my 10:00 meeting tomorrow", user(timezone=tz)) == (
+        "cancel_event", {"email": EMAIL, "date": local_date(tz, 1), "time": "10:00"}
+    )
+
+
+def test_list_without_dates():
+    assert intent_parser.parse_intent("what meetings do I have?", user()) == ("list_events", {"email": EMAIL})
+    assert intent_parser.parse_intent("show my upcoming meetings", user()) == ("list_events", {"email": EMAIL})
+
+
+def test_list_single_date():
+    assert intent_parser.parse_intent("show my meetings on 2030-01-02", user()) == (
+        "list_events", {"email": EMAIL, "start_date": "2030-01-02", "end_date": "2030-01-02"}
+    )
+
+
+def test_list_today():
+    today = local_date("UTC")
+    assert intent_parser.parse_intent("what's on my calendar today", user()) == (
+        "list_events", {"email": EMAIL, "start_date": today, "end_date": today}
+    )
+
+
+@pytest.mark.parametrize("message", [
+    "show my meetings on Friday",
+    "what meetings do I have next week",
+    "list my meetings this week",
+    "what's on my calendar in November",
+    "show my meetings in 3 days",
+    "what meetings do I have this weekend",
+    "list my meetings next month",
+    "show my meetings on Nov 5",
+    "show my meetings on the 5th",
+    "show my meetings on 11/05",
+    "show my meetings after 2030-01-02",
+    "list my meetings between 2030-01-02 and 2030-01-05",
+    "what meetings do I have this afternoon",
+    "cancel my meeting on Friday at 14:00",
+    "book a meeting next Tuesday at 9am",
+])
+def test_unsupported_date_wording_falls_back_to_model(message):
+    assert intent_parser.parse_intent(message, user()) is None
+
+
+@pytest.mark.parametrize("message", [
+    "can I cancel 2030-01-02 14:00?",
+    "cancel all my meetings tomorrow",
+    "book 2030-01-02",
+    "schedule a call 2030-01-02 at 10:00 or 11:00",
+    "reschedule 2030-01-02 14:00",
+    "cancel and book 2030-01-02 14:00",
+    "hello",
+])
+def test_ambiguous_or_incomplete_requests_fall_back_to_model(message):
+    assert intent_parser.parse_intent(message, user()) is None
+
+
+@pytest.mark.parametrize("message", [
+    "did you cancel my meeting 2030-01-02 at 14:00?",
+    "Please remind me to book 2030-01-02 14:00",
+    "cancel my meeting 2030-01-02 at 14:00?",
+    "do I need to cancel my meeting 2030-01-02 at 14:00",
+    "is my meeting 2030-01-02 at 14:00 cancelled",
+    "was the 2030-01-02 14:00 meeting booked",
+    "I have to cancel 2030-01-02 14:00 at some point",
+    "my manager will book 2030-01-02 14:00",
+])
+def test_non_command_cancel_or_book_falls_back_to_model(message):
+    assert intent_parser.parse_intent(message, user()) is None
+
+
+def test_polite_command_is_accepted():
+    assert intent_parser.parse_intent("Please cancel my meeting 2030-01-02 at 14:00", user()) == (
+        "cancel_event", {"email": EMAIL, "date": "2030-01-02", "time": "14:00"}
+    )
+
+
+def test_unknown_email_falls_back_to_model():
+    assert intent_parser.parse_intent("cancel 2030-01-02 14:00", user(email=None)) is None
+
+
+def test_email_digits_are_not_dates_or_times():
+    text = "book 2030-01-02 at 10:00 for bob2030-01-03@example.com"
+    assert intent_parser.parse_intent(text, user()) == (
+        "book_event", {"email": EMAIL, "date": "2030-01-02", "time": "10:00", "reason": "Meeting"}
+    )
+
+
+def test_parse_dates_ignores_invalid_dates():
+    assert intent_parser.parse_dates("2030-02-30 and 2030-02-28") == ["2030-02-28"]
+
+
+def test_parse_times():
+    assert intent_parser.parse_times("at 9am, 14:05 and 12:15 pm") == ["14:05", "09:00", "12:15"]
@@ -0,0 +1,91 @@
+# tests/test_single_flight.py
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("CAL_API_KEY", "cal_test_key")
+
+import cal_api_async
+import cal_transport
+
+THREADS = 8
+ROUNDS = 30
+
+
+def bookings_response():
+    return {"bookings": [{"id": i, "startTime": "2030-01-02T10:00:00Z"} for i in range(50)]}
+
+
+def localize(result, tag):
+    """模拟 localize_booking：调用方逐个修改共享结果中的预约"""
+    for booking in result["bookings"]:
+        booking["local_start"] = tag
+        booking["display_time"] = tag
+    return result
+
+
+def test_every_concurrent_caller_gets_its_own_copy():
+    flight = cal_transport.SingleFlight()
+    errors = []
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.01)
+        return bookings_response()
+
+    def caller(tag, start, results):
+        start.wait()
+        try:
+            result, _ = flight.do("bookings", fetch)
+            results[tag] = localize(result, tag)
+        except Exception as e:
+            errors.append(e)
+
+    for _ in range(ROUNDS):
+        start = threading.Barrier(THREADS)
+        results = {}
+        threads = [threading.Thread(target=caller, args=(tag, start, results)) for tag in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert not errors
+        assert len({id(result) for result in results.values()}) == THREADS
+        for tag, result in results.items():
+            assert {b["local_start"] for b in result["bookings"]} == {tag}
+    assert len(calls) < THREADS * ROUNDS
+
+
+def test_unshared_result_is_not_copied():
+    flight = cal_transport.SingleFlight()
+    response = bookings_response()
+    result, shared = flight.do("bookings", lambda: response)
+    assert result is response and not shared
+
+
+def test_async_coalesced_callers_get_their_own_copy(monkeypatch):
+    sent = []
+
+    async def send_request(method, endpoint, params=None, data=None):
+        sent.append(endpoint)
+        await asyncio.sleep(0.01)
+        return bookings_response()
+
+    monkeypatch.setattr(cal_api_async, "send_request", send_request)
+
+    async def caller(tag):
+        return localize(await cal_api_async.make_request("GET", "bookings", {"email": "a@x.com"}), tag)
+
+    async def main():
+        return await asyncio.gather(*[caller(tag) for tag in range(THREADS)])
+
+    results = asyncio.run(main())
+    assert sent == ["bookings"]
+    assert len({id(result) for result in results}) == THREADS
+    for tag, result in enumerate(results):
+        assert {b["local_start"] for b in result["bookings"]} == {tag}
@@ -0,0 +1,62 @@
+# time_utils.py
+from datetime import datetime
+from functools import lru_cache
+
+import pytz
+
+# ISO时间解析缓存大小（相同的时间字符串在时隙/预约列表中大量重复）
+PARSE_CACHE_SIZE = 4096
+
+_FALLBACK_FORMATS = ["%Y-%m-%dT%H:%M:%S%z", "%Y-%m-%dT%H:%M:%S.%f%z", "%Y-%m-%dT%H:%M%z"]
+
+
+@lru_cache(maxsize=None)
+def get_timezone(name):
+    """获取缓存的时区对象（无效时区抛出 pytz.UnknownTimeZoneError）"""
+    return pytz.timezone(name)
+
+
+def is_valid_timezone(name):
+    """检查时区名称是否有效"""
+    if not isinstance(name, str) or not name:
+        return False
+    try:
+        get_timezone(name)
+        return True
+    except pytz.UnknownTimeZoneError:
+        return False
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_iso(value):
+    """解析ISO-8601时间字符串（支持Z后缀），无法解析时返回None"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        # 尝试解析其他常见格式
+        for fmt in _FALLBACK_FORMATS:
+            try:
+                return datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+    return None
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_local(value):
+    """解析 'YYYY-MM-DD HH:MM' 格式的本地时间（格式错误抛出ValueError）"""
+    return datetime.strptime(value, "%Y-%m-%d %H:%M")
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def local_epoch(date, time, timezone="UTC"):
+    """把用户时区的本地日期时间转换为UTC epoch秒"""
+    naive = parse_local(f"{date} {time}")
+    return int(get_timezone(timezone).localize(naive).timestamp())
+
+
+def utc_iso(epoch):
+    """把UTC epoch秒格式化为以Z结尾的ISO-8601字符串"""
+    return datetime.fromtimestamp(epoch, pytz.utc).strftime("%Y-%m-%dT%H:%M:%SZ")